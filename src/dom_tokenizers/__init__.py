@@ -1 +1,5 @@
-from .pre_tokenizers import DOMSnapshotPreTokenizer
+from .pre_tokenizers import (
+    DOMSnapshotPreTokenizer,
+    RawHTMLPreTokenizer,
+    SplitBudget,
+)
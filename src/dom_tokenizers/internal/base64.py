@@ -1,8 +1,23 @@
+import re
+
 from base64 import b64decode as _b64decode, _bytes_from_decode_data, binascii
 
+_STANDARD_BASE64_RE = re.compile(rb"[A-Za-z0-9+/]*")
+
 
 def b64decode(s, *args, **kwargs) -> bytes:
     fix_padding = kwargs.pop("fix_padding", False)
+    if fix_padding and not args and not kwargs:
+        # Fix the padding before decoding, rather than after the first
+        # attempt fails, if we can be sure of what the decoder will do.
+        s = _bytes_from_decode_data(s)
+        t = s.rstrip(b"=")
+        if _STANDARD_BASE64_RE.fullmatch(t):
+            n = len(t) & 3
+            if n:
+                t += b"AA=="[n:]
+            return _b64decode(t)
+
     try:
         return _b64decode(s, *args, **kwargs)
     except binascii.Error:
@@ -1,4 +1,16 @@
-from json import *  # noqa: F403, CIR107
+import os
+import re
+
+from importlib import import_module
+from json import *  # noqa: F401, F403, CIR107
+from json import (  # noqa: CIR107
+    JSONDecodeError,
+    JSONDecoder,
+    detect_encoding,
+    loads as _stdlib_loads,
+)
+from json.decoder import scanstring  # noqa: CIR107
+from typing import Any, Optional
 
 
 # Default to compact serialization.
@@ -16,3 +28,197 @@ def __wrap(func):
 dump = __wrap(dump)  # noqa: F405
 dumps = __wrap(dumps)  # noqa: F405
 del __wrap
+
+
+# Parsers `loads` can use, in order of preference.  Whichever is
+# selected, input it won't parse (lone surrogates and NaN for orjson,
+# for example) is retried with the standard library's parser, so the
+# choice of backend never changes what parses.  It can change what
+# some numbers parse to, though: orjson parses integers too big for
+# 64 bits as floats, where the standard library keeps them as ints.
+# Set DOM_TOKENIZERS_JSON to one of these to override the default,
+# which is the first one that can be imported, or use `set_backend`.
+# Install the "fast" extra to get orjson.
+BACKENDS = ("orjson", "json")
+BACKEND_ENV_VAR = "DOM_TOKENIZERS_JSON"
+
+_backend = None
+_fast_loads = None
+
+
+def loads(s, **kwargs):
+    """Deserialize `s`, a str or bytes, with the selected backend,
+    or with the standard library if keyword arguments are given.
+    """
+    if _fast_loads is not None and not kwargs:
+        try:
+            return _fast_loads(s)
+        except JSONDecodeError:
+            pass
+    return _stdlib_loads(s, **kwargs)
+
+
+def load(fp, **kwargs):
+    return loads(fp.read(), **kwargs)
+
+
+def loads_selected(s, fields: dict) -> Any:
+    """Deserialize only the parts of `s`, a str or bytes containing a
+    JSON object, that `fields` selects.  `fields` maps the keys to keep
+    to True, to keep the whole value, to another such mapping, to keep
+    only the selected parts of the object that's there, or to a list
+    containing one such mapping, to do that for each object in the
+    array that's there.  Everything else is skipped without building
+    Python objects for it, or fully checking that it's valid.
+    """
+    if not isinstance(s, str):
+        s = s.decode(detect_encoding(s), "surrogatepass")
+    pos = _skip_whitespace(s, 0)
+    if not s.startswith("{", pos):
+        raise JSONDecodeError("Expecting object", s, pos)
+    result, pos = _select(s, pos, fields)
+    pos = _skip_whitespace(s, pos)
+    if pos != len(s):
+        raise JSONDecodeError("Extra data", s, pos)
+    return result
+
+
+_raw_decode = JSONDecoder().raw_decode
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+_STRING_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_SCALAR_RE = re.compile(r"[^,\]}\s]+")
+
+# Runs of anything but brackets, where strings and arrays of scalars
+# count as not brackets, so skipping needs fewer trips round its loop.
+_INERT_RE = re.compile(r"""
+    [^"\[\]{}]*
+    (?:
+      (?: "[^"\\]*(?:\\.[^"\\]*)*"
+        | \[[^"\[\]{}]*\]
+      )
+      [^"\[\]{}]*
+    )*
+""", re.S | re.X)
+
+
+def _select(s: str, pos: int, fields: Any) -> tuple[Any, int]:
+    if isinstance(fields, dict) and s.startswith("{", pos):
+        return _select_object(s, pos, fields)
+    if isinstance(fields, list) and s.startswith("[", pos):
+        return _select_array(s, pos, fields[0])
+    return _raw_decode(s, pos)
+
+
+def _select_object(s: str, pos: int, fields: dict) -> tuple[dict, int]:
+    result = {}
+    pos = _skip_whitespace(s, pos + 1)
+    if s.startswith("}", pos):
+        return result, pos + 1
+    while True:
+        if not s.startswith('"', pos):
+            raise JSONDecodeError(
+                "Expecting property name enclosed in double quotes", s, pos)
+        key, pos = scanstring(s, pos + 1)
+        pos = _skip_whitespace(s, pos)
+        if not s.startswith(":", pos):
+            raise JSONDecodeError("Expecting ':' delimiter", s, pos)
+        pos = _skip_whitespace(s, pos + 1)
+        selected = fields.get(key)
+        if selected:
+            result[key], pos = _select(s, pos, selected)
+        else:
+            pos = _skip_value(s, pos)
+        pos = _skip_whitespace(s, pos)
+        if s.startswith("}", pos):
+            return result, pos + 1
+        if not s.startswith(",", pos):
+            raise JSONDecodeError("Expecting ',' delimiter", s, pos)
+        pos = _skip_whitespace(s, pos + 1)
+
+
+def _select_array(s: str, pos: int, fields: dict) -> tuple[list, int]:
+    result = []
+    pos = _skip_whitespace(s, pos + 1)
+    if s.startswith("]", pos):
+        return result, pos + 1
+    while True:
+        value, pos = _select(s, pos, fields)
+        result.append(value)
+        pos = _skip_whitespace(s, pos)
+        if s.startswith("]", pos):
+            return result, pos + 1
+        if not s.startswith(",", pos):
+            raise JSONDecodeError("Expecting ',' delimiter", s, pos)
+        pos = _skip_whitespace(s, pos + 1)
+
+
+def _skip_whitespace(s: str, pos: int) -> int:
+    return _WHITESPACE_RE.match(s, pos).end()
+
+
+def _skip_value(s: str, pos: int) -> int:
+    """Return the position after the value starting at `pos`.
+    """
+    if s.startswith(("[", "{"), pos):
+        depth = 0
+        while True:
+            char = s[pos:pos + 1]
+            if char in ("[", "{"):
+                depth += 1
+            elif char in ("]", "}"):
+                depth -= 1
+                if not depth:
+                    return pos + 1
+            else:
+                break  # unterminated string, or end of input
+            pos = _INERT_RE.match(s, pos + 1).end()
+    else:
+        match = (_STRING_RE if s.startswith('"', pos) else _SCALAR_RE
+                 ).match(s, pos)
+        if match is not None:
+            return match.end()
+    raise JSONDecodeError("Expecting value", s, pos)
+
+
+def available_backends() -> list[str]:
+    """Return the names of the backends that can be imported.
+    """
+    return [name for name in BACKENDS if _import_backend(name) is not None]
+
+
+def get_backend() -> str:
+    """Return the name of the selected backend.
+    """
+    return _backend
+
+
+def set_backend(name: Optional[str] = None) -> str:
+    """Select the backend `loads` uses, and return its name.  If `name`
+    is None, use the environment variable, or the default if that is
+    unset or empty.
+    """
+    global _backend, _fast_loads
+
+    if name is None:
+        name = os.environ.get(BACKEND_ENV_VAR)
+    if not name:
+        name = available_backends()[0]
+    elif name not in BACKENDS:
+        raise ValueError(f"unknown JSON backend: {name!r}")
+
+    module = _import_backend(name)
+    if module is None:
+        raise ValueError(f"JSON backend not installed: {name!r}")
+    _backend = name
+    _fast_loads = None if name == "json" else module.loads
+    return name
+
+
+def _import_backend(name: str):
+    try:
+        return import_module(name)
+    except ImportError:
+        return None
+
+
+set_backend()
@@ -1 +1,3 @@
 from .dom_snapshot import DOMSnapshotPreTokenizer
+from .raw_html import RawHTMLPreTokenizer
+from .splitter import SplitBudget
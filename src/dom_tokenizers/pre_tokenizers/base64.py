@@ -1,5 +1,8 @@
+from collections.abc import Sequence
 from typing import Optional
 
+import numpy as np
+
 
 class B64SkewCalculator:
     def __init__(self, ranges=("AZ", "az", "09"), extras="/+"):
@@ -22,6 +25,13 @@ class B64SkewCalculator:
         alphabet_size = len(self._char_bins)
         self._expectations = [len(b) / alphabet_size for b in bins]
 
+        # Lookup table mapping ASCII codes to bin indexes, with one
+        # extra bin (index `self._num_bins`) for invalid characters.
+        self._code_bins = np.full(128, self._num_bins, dtype=np.uint8)
+        for c, bin_index in self._char_bins.items():
+            self._code_bins[ord(c)] = bin_index
+        self._np_expectations = np.array(self._expectations)
+
     def __call__(self, text: str) -> Optional[float]:
         """Return a value indicating how different `text` appears
         compared with base64-encoded random data, with zero being
@@ -43,6 +53,45 @@ class B64SkewCalculator:
             for count, expectation in zip(counts, self._expectations)
         )
 
+    def batch(self, texts: Sequence[str]) -> list[Optional[float]]:
+        """Return `[self(text) for text in texts]`, calculated for
+        all texts at once.
+        """
+        skews = [None] * len(texts)
+        valid = [
+            index
+            for index, text in enumerate(texts)
+            if text and text.isascii()
+        ]
+        if not valid:
+            return skews
+
+        # Histogram every text in one pass over their concatenation,
+        # by counting (text index, bin index) pairs.
+        joined = "".join(texts[index] for index in valid).encode("ascii")
+        char_bins = self._code_bins[np.frombuffer(joined, dtype=np.uint8)]
+        lengths = np.fromiter(
+            (len(texts[index]) for index in valid),
+            dtype=np.int64,
+            count=len(valid))
+        num_bins = self._num_bins + 1
+        char_texts = np.repeat(np.arange(len(valid)) * num_bins, lengths)
+        counts = np.bincount(
+            char_texts + char_bins,
+            minlength=len(valid) * num_bins,
+        ).reshape(len(valid), num_bins)
+
+        normalized = 1 / lengths
+        scores = np.abs(
+            normalized[:, np.newaxis] * counts[:, :-1]
+            - self._np_expectations
+        ).max(axis=1)
+        is_valid = counts[:, -1] == 0  # no invalid characters
+        for index, score, ok in zip(valid, scores.tolist(), is_valid):
+            if ok:
+                skews[index] = score
+        return skews
+
 
 base64_skew = B64SkewCalculator(extras=None)
 
@@ -56,3 +105,21 @@ def base64_probability(text: str) -> float:
     if not skew:
         return 0
     return 1 - skew
+
+
+def base64_probabilities(texts: Sequence[str]) -> list[float]:
+    """Return `[base64_probability(text) for text in texts]`,
+    calculated for all texts at once.
+    """
+    return [
+        1 - skew if skew else 0
+        for skew in base64_skew.batch(texts)
+    ]
+
+
+def symbol_coincidences(text: str) -> int:
+    """Return the number of pairs of positions in ASCII `text` which
+    hold the same symbol, i.e. the observed value of Friedman's phi.
+    """
+    hist = np.bincount(np.frombuffer(text.encode("ascii"), dtype=np.uint8))
+    return int((hist * (hist - 1)).sum())
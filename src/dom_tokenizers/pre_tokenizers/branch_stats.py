@@ -0,0 +1,92 @@
+import time
+
+from collections import Counter, defaultdict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+@dataclass
+class BranchStats:
+    """How many times `TextSplitter.split` took each of its branches,
+    and, if `timing` is set, the total time in seconds spent in the
+    trips round the splitting loop that took them.
+    """
+    timing: bool = False
+    counts: Counter[str] = field(default_factory=Counter)
+    seconds: defaultdict[str, float] = field(
+        default_factory=lambda: defaultdict(float))
+
+    def clear(self):
+        self.counts.clear()
+        self.seconds.clear()
+
+    def summary(self) -> list[tuple[str, int, float]]:
+        """Return (branch, count, seconds) for each branch taken, most
+        taken first.
+        """
+        return [
+            (branch, count, self.seconds.get(branch, 0.0))
+            for branch, count in self.counts.most_common()
+        ]
+
+
+# The statistics every splitter in this process adds to, if enabled.
+active: Optional[BranchStats] = None
+
+
+def enable_branch_stats(timing: bool = False) -> BranchStats:
+    """Start gathering branch statistics for this process, or just
+    start timing if already gathering, and return the statistics.
+    """
+    global active
+    if active is None:
+        active = BranchStats()
+    active.timing = active.timing or timing
+    return active
+
+
+def disable_branch_stats() -> Optional[BranchStats]:
+    """Stop gathering branch statistics for this process, and return
+    what was gathered, if anything.
+    """
+    global active
+    result, active = active, None
+    return result
+
+
+class BranchTracer:
+    """Record the branches one split takes in `stats`, if not None,
+    and pass them to `log`, if not None.
+    """
+    def __init__(
+            self,
+            stats: Optional[BranchStats],
+            log: Optional[Callable[[str], None]] = None,
+    ):
+        self._counts = None if stats is None else stats.counts
+        self._log = log
+        self._seconds = None
+        if stats is not None and stats.timing:
+            self._seconds = stats.seconds
+            self._started = time.perf_counter()
+        self._branch = None
+
+    @property
+    def is_timing(self) -> bool:
+        return self._seconds is not None
+
+    def __call__(self, branch: str):
+        if self._log is not None:
+            self._log(branch)
+        if self._counts is not None:
+            self._counts[branch] += 1
+        self._branch = branch
+
+    def lap(self):
+        """Add the time since the last lap to the last branch taken."""
+        now = time.perf_counter()
+        if self._branch is not None:
+            self._seconds[self._branch] += now - self._started
+            self._branch = None
+        self._started = now
@@ -1,75 +1,236 @@
 import logging
+import sys
 
 from collections import defaultdict
-from dataclasses import make_dataclass
+from collections.abc import Callable
+from functools import cache
+from typing import NamedTuple, Optional
 from xml.dom import Node
 
-from tokenizers import NormalizedString
+from tokenizers import Encoding, NormalizedString
 
 from ..internal import json
-from .compat_itertools import batched
-from .html import is_void_element
+from .html import ATTRIBUTE_NAMES, TAG_NAMES, is_void_element
 from .pre_tokenizer import PreTokenizer
-from .splitter import TextSplitter, Flags as Split
+from .split_cache import SplitCache, DEFAULT_MAX_ENTRIES, DEFAULT_MAX_SIZE
+from .splitter import SplitBudget, TextSplitter, Flags as Split
 from .token_buffer import TokenBuffer
 
 logger = logging.getLogger(__name__)
 
+# A DOM snapshot, either parsed or as serialized JSON.
+Snapshot = dict | str | bytes
+
+# How to split the values of attributes whose values are, or contain,
+# URLs, if URL splitting is enabled.
+URL_ATTR_VALUE_FLAGS = {
+    "action": Split.URL_ATTR_VALUE,
+    "cite": Split.URL_ATTR_VALUE,
+    "formaction": Split.URL_ATTR_VALUE,
+    "href": Split.URL_ATTR_VALUE,
+    "poster": Split.URL_ATTR_VALUE,
+    "src": Split.URL_ATTR_VALUE,
+    "srcset": Split.URL_ATTR_VALUE,
+    "style": Split.STYLE_ATTR_VALUE,
+    "xlink:href": Split.URL_ATTR_VALUE,
+}
+
+# The parts of serialized snapshots pre-tokenizing reads, for when
+# `stream_snapshots` is set.  Raw browser responses wrap the snapshot
+# in "result".
+SNAPSHOT_FIELDS = {
+    "documents": [{
+        "documentURL": True,
+        "publicId": True,
+        "systemId": True,
+        "nodes": {
+            "parentIndex": True,
+            "nodeType": True,
+            "nodeName": True,
+            "nodeValue": True,
+            "attributes": True,
+        },
+    }],
+    "strings": True,
+}
+SNAPSHOT_FIELDS["result"] = SNAPSHOT_FIELDS
+
+# How to split text whose parent element contains code.
+TEXT_FLAGS = {
+    "script": Split.SCRIPT_TEXT,
+    "style": Split.STYLE_TEXT,
+}
+
 
 class DOMSnapshotPreTokenizer(PreTokenizer):
     """Pre-tokenizer that consumes JSON-serialized DOM snapshots
     and emits tokenized representations of the snapshotted DOMs.
+    Use `encode_snapshot`, `tokenize_snapshot` or `pre_tokenize_snapshot`
+    to pass snapshots that are already parsed, or are UTF-8 bytes.
     """
-    _SENTINEL = type("Sentinel", (), dict(index=-1))
+    def __init__(
+            self,
+            *,
+            split_cache_max_entries: int = DEFAULT_MAX_ENTRIES,
+            split_cache_max_size: int = DEFAULT_MAX_SIZE,
+            split_cache_words: bool = True,
+            split_urls: bool = False,
+            split_budget: Optional[SplitBudget] = None,
+            stream_snapshots: bool = False,
+            max_pre_tokens: Optional[int] = None,
+            on_truncated: Optional[Callable[[int, int], None]] = None,
+    ):
+        """Split results are cached across calls to `pre_tokenize_dom`
+        in `self.split_cache`, which is limited to holding at most
+        `split_cache_max_entries` entries and `split_cache_max_size`
+        bytes.  If `split_cache_words` is True, strings that split the
+        same a word at a time, like most class lists, are cached by
+        word.  The text of elements in `TEXT_FLAGS`, <script> and
+        <style>, is lexed as code.  If `split_urls` is True, the values
+        of attributes in `URL_ATTR_VALUE_FLAGS` are split structurally
+        as URLs.  If `split_budget` is given, strings that exceed it
+        are split more cheaply, and the results cached like any others.
+        If `stream_snapshots` is True, serialized snapshots are parsed
+        in one pass that keeps only the parts in `SNAPSHOT_FIELDS`.
+        If `max_pre_tokens` is given, the walk stops at the first node
+        after that many pre-tokens, then closes the elements still open;
+        `on_truncated`, if given, is then called with the number of
+        nodes walked and the number of nodes in the snapshot.  To use
+        non-default options, construct the pre-tokenizer yourself and
+        use its `bind_to` method instead of `hook_into`.
+        """
+        super().__init__()
+        self.split_urls = split_urls
+        self.stream_snapshots = stream_snapshots
+        self.max_pre_tokens = max_pre_tokens
+        self.on_truncated = on_truncated
+        self._splitter.budget = split_budget
+        self.split_cache = SplitCache(
+            self._splitter,
+            max_entries=split_cache_max_entries,
+            max_size=split_cache_max_size,
+            cache_words=split_cache_words,
+        )
+
+    def pre_tokenize_snapshot(self, snapshot: Snapshot) -> list[str]:
+        """Return the pre-tokens of `snapshot`, normalized like the
+        bound tokenizer's pre-tokenizer normalizes them, or as they are
+        if this pre-tokenizer is unbound.
+        """
+        return self._pre_tokenize_direct(snapshot)
+
+    def encode_snapshot(
+            self,
+            snapshot: Snapshot,
+            add_special_tokens: bool = True,
+    ) -> Encoding:
+        """Encode `snapshot` with the bound tokenizer.
+        """
+        return self._encode_direct(
+            snapshot, add_special_tokens=add_special_tokens)
 
-    def pre_tokenize_dom(self, buf: TokenBuffer, serialized: str):
-        """Transform a serialized DOM into a sequence of tokens.
+    def tokenize_snapshot(self, snapshot: Snapshot) -> list[str]:
+        """Return the tokens the bound tokenizer's `tokenize` method
+        would return for `snapshot`.
         """
-        snapshot = json.loads(serialized)
+        return self.encode_snapshot(snapshot, add_special_tokens=False).tokens
+
+    def pre_tokenize_dom(self, buf: TokenBuffer, snapshot: Snapshot):
+        """Transform a DOM snapshot into a sequence of tokens.
+        """
+        if not isinstance(snapshot, dict):
+            if self.stream_snapshots:
+                snapshot = json.loads_selected(snapshot, SNAPSHOT_FIELDS)
+            else:
+                snapshot = json.loads(snapshot)
 
         # Unpack the snapshot if what we have is a raw browser response
         if not any(key in snapshot for key in ("documents", "strings")):
             snapshot = snapshot.get("result", snapshot)
 
-        split = TokenCache(snapshot["strings"], self._splitter).get
+        strings = snapshot["strings"]
+        split = TokenCache(strings, self.split_cache).get
+        if self.split_urls:
+            value_flags = URL_ATTR_VALUE_FLAGS
+        else:
+            value_flags = {}
+        names_cache = NameTokenCache(
+            strings,
+            split,
+            value_flags,
+            # The table holds what a default splitter makes of them.
+            use_html_table=self._splitter == TextSplitter())
+        tags = names_cache.tags
+        attrs = names_cache.attrs
+        get_tag = names_cache.get_tag
+        get_attr = names_cache.get_attr
+
+        pre_tokens = buf.tokens
+        max_pre_tokens = self.max_pre_tokens
+        if max_pre_tokens is None:
+            max_pre_tokens = sys.maxsize
+        nodes_walked = 0
+        truncated = False
 
         for doc_index, document in enumerate(snapshot["documents"]):
             logger.info(
                 "doc %d: %s",
                 doc_index,
-                snapshot["strings"][document["documentURL"]])
+                strings[document["documentURL"]])
 
-            stack = [self._SENTINEL]
-            for node in _Node.each(document["nodes"]):
-                while stack[-1].index != node.parent_index:
-                    self._terminate(buf, split, stack.pop())
+            # Walk the node columns in parallel, struct-of-arrays style,
+            # keeping the indexes of the open nodes on the stack.
+            nodes = document["nodes"]
+            names = nodes["nodeName"]
+            stack = [-1]
+            for index, (parent_index, node_type, name_index, value_index,
+                        attr_indexes) in enumerate(zip(
+                            nodes["parentIndex"],
+                            nodes["nodeType"],
+                            names,
+                            nodes["nodeValue"],
+                            nodes["attributes"])):
+                if len(pre_tokens) >= max_pre_tokens:
+                    truncated = True
+                    break
 
-                match node.type:
+                while stack[-1] != parent_index:
+                    closed_index = names[stack.pop()]
+                    buf.extend((tags.get(closed_index)
+                                or get_tag(closed_index)).end)
+
+                match node_type:
                     case Node.ELEMENT_NODE:
-                        buf.append("<")
-                        buf.extend(split(node.name_index, Split.TAG_NAME))
-                        for name_index, value_index in node.attr_indexes:
-                            buf.append("_")
-                            buf.extend(split(name_index, Split.ATTR_NAME))
-                            buf.append("=")
-                            buf.extend(split(value_index, Split.ATTR_VALUE))
+                        buf.extend((tags.get(name_index)
+                                    or get_tag(name_index)).start)
+                        attr_indexes = iter(attr_indexes)
+                        for attr_name_index in attr_indexes:
+                            attr_tokens, attr_value_flags = (
+                                attrs.get(attr_name_index)
+                                or get_attr(attr_name_index))
+                            buf.extend(attr_tokens)
+                            buf.extend(split(
+                                next(attr_indexes), attr_value_flags))
                         buf.append(">")
-                        stack.append(node)
+                        stack.append(index)
 
                     case Node.TEXT_NODE:
-                        buf.extend(split(node.value_index, Split.TEXT))
+                        parent_name_index = names[parent_index]
+                        buf.extend(split(value_index, (
+                            tags.get(parent_name_index)
+                            or get_tag(parent_name_index)).text_flags))
 
                     case Node.DOCUMENT_NODE:
-                        stack.append(node)
+                        stack.append(index)
 
                     case Node.COMMENT_NODE:
                         buf.append("<!--")
-                        buf.extend(split(node.value_index, Split.COMMENT))
+                        buf.extend(split(value_index, Split.COMMENT))
                         buf.append("-->")
 
                     case Node.DOCUMENT_TYPE_NODE:
                         buf.append("<!DOCTYPE")
-                        buf.extend(split(node.name_index, Split.DOCTYPE))
+                        buf.extend(split(name_index, Split.DOCTYPE))
                         public_index = document["publicId"]
                         if public_index >= 0:
                             buf.append("PUBLIC")
@@ -79,50 +240,130 @@ class DOMSnapshotPreTokenizer(PreTokenizer):
                             buf.extend(split(system_index, Split.DOCTYPE))
                         buf.append(">")
 
-        for node in reversed(stack[2:]):
-            self._terminate(buf, split, node)
+            nodes_walked += index if truncated else len(names)
+            if truncated:
+                break
 
-    @staticmethod
-    def _terminate(buf, split, node):
-        tokens = split(node.name_index, Split.TAG_NAME)
-        if is_void_element(tokens[-1].original):
-            return
-        buf.append("</")
-        buf.extend(tokens)
-        buf.append(">")
-
-
-class _BaseNode:
-    FIELDS = {
-        "parentIndex": ("parent_index", int),
-        "nodeType": ("type", int),
-        "nodeName": ("name_index", int),
-        "nodeValue": ("value_index", int),
-        "attributes": ("_attr_indexes", list[int]),
-    }
+        for index in reversed(stack[2:]):
+            name_index = names[index]
+            buf.extend((tags.get(name_index) or get_tag(name_index)).end)
+
+        if truncated:
+            nodes_total = sum(
+                len(document["nodes"]["nodeName"])
+                for document in snapshot["documents"])
+            logger.info(
+                "truncated after %d of %d nodes",
+                nodes_walked,
+                nodes_total)
+            if self.on_truncated is not None:
+                self.on_truncated(nodes_walked, nodes_total)
+
+
+class TagTokens(NamedTuple):
+    """Pre-tokens for an element with a given tag name.
+    """
+    start: tuple[NormalizedString, ...]  # "<" then the name
+    end: tuple[NormalizedString, ...]    # "</", name, ">", unless void
+    text_flags: Split                    # How to split child text
 
     @classmethod
-    def each(cls, nodes):
-        return (
-            cls(index, *values)
-            for index, values in enumerate(zip(*(
-                    nodes[field]
-                    for field in cls.FIELDS)))
+    def for_tag(cls, name: str, tokens: list[NormalizedString]):
+        if is_void_element(tokens[-1].original):
+            end = ()
+        else:
+            end = (_END_TAG_OPEN, *tokens, _TAG_CLOSE)
+        return cls(
+            start=(_START_TAG_OPEN, *tokens),
+            end=end,
+            text_flags=TEXT_FLAGS.get(name.lower(), Split.TEXT),
         )
 
-    @property
-    def attr_indexes(self):
-        return batched(self._attr_indexes, 2)
 
+def _attr_tokens(tokens: list[NormalizedString]):
+    return (_ATTR_NAME_OPEN, *tokens, _ATTR_NAME_CLOSE)
+
+
+_START_TAG_OPEN = NormalizedString("<")
+_END_TAG_OPEN = NormalizedString("</")
+_TAG_CLOSE = NormalizedString(">")
+_ATTR_NAME_OPEN = NormalizedString("_")
+_ATTR_NAME_CLOSE = NormalizedString("=")
+
+
+@cache
+def html_name_tokens() -> tuple[dict[str, TagTokens], dict[str, tuple]]:
+    """Return the process-wide tables of pre-tokens for the tag names
+    in `html.TAG_NAMES`, as they appear in DOM snapshots, and for the
+    attribute names in `html.ATTRIBUTE_NAMES`, with the "_" and "="
+    either side of them.
+    """
+    splitter = TextSplitter()
+
+    def split(name, flags):
+        return [NormalizedString(token)
+                for token in splitter.split(name, flags)]
+
+    tags = {
+        name: TagTokens.for_tag(name, split(name, Split.TAG_NAME))
+        for name in TAG_NAMES | {name.upper() for name in TAG_NAMES}
+    }
+    attrs = {
+        name: _attr_tokens(split(name, Split.ATTR_NAME))
+        for name in ATTRIBUTE_NAMES
+    }
+    return tags, attrs
+
+
+class NameTokenCache:
+    """Pre-tokens for the tag and attribute names in one DOM snapshot's
+    string table, keyed by string index, from `html_name_tokens` where
+    possible.  Each attribute's pre-tokens come with the flags to split
+    its values with.
+    """
+    def __init__(
+            self,
+            strings: list[str],
+            split: Callable[[int, Split], list[NormalizedString]],
+            value_flags: dict[str, Split],
+            use_html_table: bool = True,
+    ):
+        self._strings = strings
+        self._split = split
+        self._value_flags = value_flags
+        if use_html_table:
+            self._known_tags, self._known_attrs = html_name_tokens()
+        else:
+            self._known_tags = self._known_attrs = {}
+        self.tags = {}
+        self.attrs = {}
 
-_Node = make_dataclass(
-    "Node",
-    [("index", int)] + list(_BaseNode.FIELDS.values()),
-    bases=(_BaseNode,))
+    def get_tag(self, name_index: int) -> TagTokens:
+        name = self._strings[name_index]
+        tag = self._known_tags.get(name)
+        if tag is None:
+            tag = TagTokens.for_tag(
+                name, self._split(name_index, Split.TAG_NAME))
+        self.tags[name_index] = tag
+        return tag
+
+    def get_attr(self, name_index: int) -> tuple[tuple, Split]:
+        name = self._strings[name_index]
+        tokens = self._known_attrs.get(name)
+        if tokens is None:
+            tokens = _attr_tokens(
+                self._split(name_index, Split.ATTR_NAME))
+        attr = tokens, self._value_flags.get(name, Split.ATTR_VALUE)
+        self.attrs[name_index] = attr
+        return attr
 
 
 class TokenCache:
-    def __init__(self, strings: list[str], splitter: TextSplitter):
+    def __init__(
+            self,
+            strings: list[str],
+            splitter: TextSplitter | SplitCache,
+    ):
         self._strings = strings
         self._splitter = splitter
         self._cache = defaultdict(dict)
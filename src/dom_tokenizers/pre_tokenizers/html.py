@@ -18,3 +18,118 @@ VOID_ELEMENTS = {
 
 def is_void_element(tag: str) -> bool:
     return tag.lower() in VOID_ELEMENTS
+
+
+# https://html.spec.whatwg.org/multipage/syntax.html#optional-tags
+# Start tags that close the innermost open element while it's one of
+# the elements they map to, as if its end tag had been seen.
+_CLOSES_P = {"p"}
+_CLOSES_ROW = {"tr", "td", "th"}
+IMPLIED_END_TAGS = {
+    "li": {"li"},
+    "dt": {"dt", "dd"},
+    "dd": {"dt", "dd"},
+    "option": {"option"},
+    "optgroup": {"option", "optgroup"},
+    "tr": _CLOSES_ROW,
+    "td": {"td", "th"},
+    "th": {"td", "th"},
+    "thead": _CLOSES_ROW | {"thead", "tbody", "tfoot"},
+    "tbody": _CLOSES_ROW | {"thead", "tbody", "tfoot"},
+    "tfoot": _CLOSES_ROW | {"thead", "tbody", "tfoot"},
+    "body": {"head"},
+    **{tag: _CLOSES_P for tag in """
+        address article aside blockquote details dialog div dl fieldset
+        figcaption figure footer form h1 h2 h3 h4 h5 h6 header hgroup hr
+        main menu nav ol p pre search section table ul
+    """.split()},
+}
+
+
+# https://html.spec.whatwg.org/multipage/indices.html#elements-3,
+# plus obsolete elements that still turn up, and common SVG elements.
+TAG_NAMES = frozenset("""
+    a abbr address area article aside audio b base bdi bdo blockquote
+    body br button canvas caption cite code col colgroup data datalist
+    dd del details dfn dialog div dl dt em embed fieldset figcaption
+    figure footer form h1 h2 h3 h4 h5 h6 head header hgroup hr html i
+    iframe img input ins kbd label legend li link main map mark menu
+    meta meter nav noscript object ol optgroup option output p picture
+    pre progress q rp rt ruby s samp script search section select slot
+    small source span strong style sub summary sup table tbody td
+    template textarea tfoot th thead time title tr track u ul var video
+    wbr
+
+    acronym applet basefont big center dir font frame frameset marquee
+    nobr noframes strike tt
+
+    svg g path circle ellipse line polyline polygon rect text tspan
+    defs use symbol clipPath mask pattern linearGradient radialGradient
+    stop filter image foreignObject desc
+""".split())
+
+# https://html.spec.whatwg.org/multipage/indices.html#attributes-3,
+# plus common ARIA, event handler, obsolete and SVG attributes.
+ATTRIBUTE_NAMES = frozenset("""
+    abbr accept accept-charset accesskey action allow allowfullscreen
+    alt as async autocapitalize autocomplete autofocus autoplay
+    blocking charset checked cite class color cols colspan content
+    contenteditable controls coords crossorigin data datetime decoding
+    default defer dir dirname disabled download draggable enctype
+    enterkeyhint fetchpriority for form formaction formenctype
+    formmethod formnovalidate formtarget headers height hidden high
+    href hreflang http-equiv id imagesizes imagesrcset inert inputmode
+    integrity is ismap itemid itemprop itemref itemscope itemtype kind
+    label lang list loading loop low max maxlength media method min
+    minlength multiple muted name nomodule nonce novalidate open
+    optimum pattern ping placeholder playsinline popover
+    popovertarget popovertargetaction poster preload readonly
+    referrerpolicy rel required reversed role rows rowspan sandbox
+    scope selected shape size sizes slot span spellcheck src srcdoc
+    srclang srcset start step style tabindex target title translate
+    type usemap value width wrap
+
+    aria-controls aria-current aria-describedby aria-disabled
+    aria-expanded aria-haspopup aria-hidden aria-label
+    aria-labelledby aria-live aria-pressed aria-selected
+
+    onblur onchange onclick onerror onfocus oninput onkeydown onkeyup
+    onload onmousedown onmouseout onmouseover onmouseup onsubmit
+
+    align bgcolor border cellpadding cellspacing frameborder hspace
+    language marginheight marginwidth scrolling valign vspace
+
+    clip-path clip-rule cx cy d fill fill-opacity fill-rule
+    focusable opacity points preserveAspectRatio r rx ry stroke
+    stroke-dasharray stroke-linecap stroke-linejoin stroke-width
+    transform viewBox x x1 x2 xlink:href xmlns xmlns:xlink y y1 y2
+""".split())
+
+# https://html.spec.whatwg.org/multipage/parsing.html#adjust-svg-attributes
+# and #adjust-mathml-attributes: the case attributes of SVG and MathML
+# elements get, where HTML parsing lowercases them.
+FOREIGN_ATTRIBUTE_NAMES = {
+    namespace: {name.lower(): name for name in names.split()}
+    for namespace, names in {
+        "svg": """
+            attributeName attributeType baseFrequency baseProfile calcMode
+            clipPathUnits diffuseConstant edgeMode filterUnits glyphRef
+            gradientTransform gradientUnits kernelMatrix kernelUnitLength
+            keyPoints keySplines keyTimes lengthAdjust limitingConeAngle
+            markerHeight markerUnits markerWidth maskContentUnits
+            maskUnits numOctaves pathLength patternContentUnits
+            patternTransform patternUnits pointsAtX pointsAtY pointsAtZ
+            preserveAlpha preserveAspectRatio primitiveUnits refX refY
+            repeatCount repeatDur requiredExtensions requiredFeatures
+            specularConstant specularExponent spreadMethod startOffset
+            stdDeviation stitchTiles surfaceScale systemLanguage
+            tableValues targetX targetY textLength viewBox viewTarget
+            xChannelSelector yChannelSelector zoomAndPan
+        """,
+        "math": "definitionURL",
+    }.items()
+}
+
+# https://html.spec.whatwg.org/multipage/parsing.html#html-integration-point
+# SVG elements whose children are HTML again.
+SVG_HTML_INTEGRATION_POINTS = {"foreignobject", "desc", "title"}
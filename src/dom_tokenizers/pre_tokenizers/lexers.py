@@ -0,0 +1,51 @@
+import re
+
+# Single-pass lexers for the contents of <script> and <style> elements.
+# Each matches the lexemes that carry tokens, skipping the punctuation
+# and whitespace between them.  The last group a match sets is:
+#   - "word", for a run of ASCII letters and digits that splits as
+#     itself (see `TextSplitter.SIMPLE_TEXT_RE`);
+#   - "url", for a CSS `url()` with an unquoted argument, which is
+#     split as the word in "url_function" then the argument;
+#   - anything else, for the contents of a comment or string literal,
+#     or any other run of letters and digits, which are split as text.
+# Unterminated comments and strings run to the end of the text, or,
+# for strings that can't contain newlines, to the end of the line.
+# JavaScript regular expression literals are told from division by
+# what precedes them, the way most syntax highlighters do it.
+
+
+def _quoted(quote: str, group: str, multiline: bool = False) -> str:
+    plain = rf"[^{quote}\\]" if multiline else rf"[^{quote}\\\n]"
+    return rf"{quote}(?P<{group}>{plain}*(?:\\(?s:.){plain}*)*){quote}?"
+
+
+_REGEX_CHARS = r"[^/\\\n\[]*"
+_REGEX_CLASS = r"\[[^\]\\\n]*(?:\\.[^\]\\\n]*)*\]"
+_REGEX = (
+    r"(?:(?<=[(,=:\[!&|?{};])|(?<=\breturn))\s*/(?![*/])"
+    rf"(?P<regex>{_REGEX_CHARS}(?:(?:\\.|{_REGEX_CLASS}){_REGEX_CHARS})*)/"
+)
+
+_WORDS = r"""
+  | (?P<word>(?!0[xX])[0-9A-Za-z]{1,23}(?![^\W_]))
+  | (?P<other>[^\W_]+)
+"""
+
+JS_LEXEME_RE = re.compile(rf"""
+    //(?P<comment>[^\n]*)
+  | /\*(?P<block_comment>(?s:.*?))(?:\*/|\Z)
+  | {_REGEX}
+  | {_quoted('"', "string")}
+  | {_quoted("'", "sq_string")}
+  | {_quoted("`", "template", multiline=True)}
+  {_WORDS}
+""", re.X)
+
+CSS_LEXEME_RE = re.compile(rf"""
+    /\*(?P<comment>(?s:.*?))(?:\*/|\Z)
+  | {_quoted('"', "string")}
+  | {_quoted("'", "sq_string")}
+  | (?P<url_function>(?i:url))\(\s*(?P<url>[^"'()\s]+)\s*\)
+  {_WORDS}
+""", re.X)
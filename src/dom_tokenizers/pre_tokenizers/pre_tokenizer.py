@@ -1,9 +1,11 @@
 import logging
+import threading
 import weakref
 
 from abc import ABC, abstractmethod
+from typing import Any
 
-from tokenizers import NormalizedString, PreTokenizedString
+from tokenizers import Encoding, NormalizedString, PreTokenizedString
 from tokenizers.pre_tokenizers import PreTokenizer as _PreTokenizer
 
 from .splitter import TextSplitter
@@ -22,6 +24,7 @@ class PreTokenizer(ABC):
     def __init__(self):
         self._splitter = TextSplitter()
         self._tokenizer = None
+        self._direct = threading.local()
 
     def bind_to(self, tokenizer):
         """Reconfigure `tokenizer` to pre-tokenize using `self`.
@@ -77,14 +80,51 @@ class PreTokenizer(ABC):
 
     pre_tokenize.__doc__ = _PreTokenizer.pre_tokenize.__doc__
 
+    # What `_encode_direct` passes through the Rust layer in place of
+    # the input it hands straight to `_pre_tokenize_dom`.
+    _DIRECT_INPUT = "{direct input}"
+
+    def _encode_direct(self, dom: Any, **kwargs) -> Encoding:
+        """Encode `dom` with the bound tokenizer, without serializing
+        it to get it through the Rust layer.
+        """
+        if self._tokenizer is None:
+            raise RuntimeError("not bound")
+        self._direct.input = dom
+        try:
+            return self._backend_tokenizer.encode(self._DIRECT_INPUT, **kwargs)
+        finally:
+            del self._direct.input
+
+    def _pre_tokenize_direct(self, dom: Any) -> list[str]:
+        """Return the pre-tokens of `dom`, normalized like the bound
+        tokenizer's pre-tokenizer normalizes them, or as they are if
+        this pre-tokenizer is unbound.
+        """
+        buf = TokenBuffer()
+        self.pre_tokenize_dom(buf, dom)
+        tokens = [token.original for token in buf.tokens]
+        if self._tokenizer is None:
+            return tokens
+        # Normalize copies: repeated tokens share NormalizedStrings.
+        special_tokens = self.special_tokens
+        normalize = self._normalizer.normalize_str
+        return [
+            token if token in special_tokens else normalize(token)
+            for token in tokens
+        ]
+
     def _pre_tokenize_dom(
             self,
             index: int,
             split: NormalizedString,
     ) -> list[NormalizedString]:
         try:
+            dom = split.original
+            if dom == self._DIRECT_INPUT:
+                dom = getattr(self._direct, "input", dom)
             buf = TokenBuffer()
-            self.pre_tokenize_dom(buf, split.original)
+            self.pre_tokenize_dom(buf, dom)
             return buf.tokens
         except Exception as e:  # pragma: no cover
             logger.exception(f"{type(e).__name__} in pre-tokenizer:")
@@ -94,7 +134,8 @@ class PreTokenizer(ABC):
     def pre_tokenize_dom(
             self,
             buf: TokenBuffer,
-            serialized: str):  # pragma: no cover
-        """Transform a serialized DOM into a sequence of tokens.
+            dom: Any):  # pragma: no cover
+        """Transform a DOM, serialized or already parsed, into a
+        sequence of tokens.
         """
         raise NotImplementedError
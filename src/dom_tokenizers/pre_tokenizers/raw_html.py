@@ -0,0 +1,282 @@
+import codecs
+import re
+
+from html.parser import HTMLParser
+from typing import IO, Optional
+
+from tokenizers import Encoding, NormalizedString
+
+from .dom_snapshot import (
+    URL_ATTR_VALUE_FLAGS,
+    TagTokens,
+    html_name_tokens,
+)
+from .html import (
+    FOREIGN_ATTRIBUTE_NAMES,
+    IMPLIED_END_TAGS,
+    SVG_HTML_INTEGRATION_POINTS,
+)
+from .pre_tokenizer import PreTokenizer
+from .split_cache import SplitCache, DEFAULT_MAX_ENTRIES, DEFAULT_MAX_SIZE
+from .splitter import SplitBudget, TextSplitter, Flags as Split
+from .token_buffer import TokenBuffer
+
+# Raw HTML, either as text, as UTF-8 bytes, or as a file object
+# opened in either mode.
+RawHTML = str | bytes | IO
+
+# How much of a file object to read at a time.
+READ_SIZE = 64 * 1024
+
+
+class RawHTMLPreTokenizer(PreTokenizer):
+    """Pre-tokenizer that consumes raw HTML and emits the same kind of
+    tokenized representations `DOMSnapshotPreTokenizer` emits for DOM
+    snapshots, without a browser to render the HTML first.  The HTML
+    is parsed as it's read, so file objects are never read whole.  Use
+    `encode_html`, `tokenize_html` or `pre_tokenize_html` to pass HTML
+    that is bytes or a file object.
+
+    There's no script to run and no tree to build, so what's emitted
+    follows the markup: elements a browser would insert, like <tbody>,
+    aren't emitted, and elements that aren't closed are closed when
+    an enclosing element is, when a start tag implies their end (see
+    `html.IMPLIED_END_TAGS`), or at the end of the input.  As in
+    browsers, self-closing start tags close only SVG and MathML
+    elements, whose attribute names keep their case.
+    """
+    def __init__(
+            self,
+            *,
+            split_cache_max_entries: int = DEFAULT_MAX_ENTRIES,
+            split_cache_max_size: int = DEFAULT_MAX_SIZE,
+            split_cache_words: bool = True,
+            split_urls: bool = False,
+            split_budget: Optional[SplitBudget] = None,
+    ):
+        """Create a new raw HTML pre-tokenizer.  The options are as for
+        `DOMSnapshotPreTokenizer`.  To use non-default options, construct
+        the pre-tokenizer yourself and use its `bind_to` method instead
+        of `hook_into`.
+        """
+        super().__init__()
+        self.split_urls = split_urls
+        self._splitter.budget = split_budget
+        self.split_cache = SplitCache(
+            self._splitter,
+            max_entries=split_cache_max_entries,
+            max_size=split_cache_max_size,
+            cache_words=split_cache_words,
+        )
+
+    def pre_tokenize_html(self, html: RawHTML) -> list[str]:
+        """Return the pre-tokens of `html`, normalized like the bound
+        tokenizer's pre-tokenizer normalizes them, or as they are if
+        this pre-tokenizer is unbound.
+        """
+        return self._pre_tokenize_direct(html)
+
+    def encode_html(
+            self,
+            html: RawHTML,
+            add_special_tokens: bool = True,
+    ) -> Encoding:
+        """Encode `html` with the bound tokenizer.
+        """
+        return self._encode_direct(
+            html, add_special_tokens=add_special_tokens)
+
+    def tokenize_html(self, html: RawHTML) -> list[str]:
+        """Return the tokens the bound tokenizer's `tokenize` method
+        would return for `html`.
+        """
+        return self.encode_html(html, add_special_tokens=False).tokens
+
+    def pre_tokenize_dom(self, buf: TokenBuffer, html: RawHTML):
+        """Transform raw HTML into a sequence of tokens.
+        """
+        parser = _HTMLTokenizer(
+            buf,
+            self.split_cache.split,
+            URL_ATTR_VALUE_FLAGS if self.split_urls else {},
+            # The table holds what a default splitter makes of them.
+            use_html_table=self._splitter == TextSplitter())
+        if isinstance(html, str):
+            parser.feed(html)
+        elif isinstance(html, bytes):
+            parser.feed(html.decode("utf-8", "replace"))
+        else:
+            decoder = None
+            while chunk := html.read(READ_SIZE):
+                if isinstance(chunk, bytes):
+                    if decoder is None:
+                        decoder = _UTF8Decoder("replace")
+                    chunk = decoder.decode(chunk)
+                parser.feed(chunk)
+            if decoder is not None:
+                parser.feed(decoder.decode(b"", final=True))
+        parser.close()
+
+
+_UTF8Decoder = codecs.getincrementaldecoder("utf-8")
+
+_DOCTYPE_RE = re.compile(r"""
+    doctype\s*(?P<name>[^\s>]*)
+    (?:\s+public\s*(?P<public>"[^"]*"|'[^']*')
+    |\s+system)?
+    \s*(?P<system>"[^"]*"|'[^']*')?
+""", re.I | re.X)
+
+
+class _HTMLTokenizer(HTMLParser):
+    """Parser that emits pre-tokens for the markup it's fed, splitting
+    text with `split`.
+    """
+    def __init__(self, buf, split, value_flags, use_html_table=True):
+        super().__init__(convert_charrefs=True)
+        self._buf = buf
+        self._split = split
+        self._value_flags = value_flags
+        if use_html_table:
+            self._known_tags, self._known_attrs = html_name_tokens()
+        else:
+            self._known_tags = self._known_attrs = {}
+        self._tags = {}
+        self._attrs = {}
+        self._stack = []  # Names of the open elements
+        self._namespaces = []  # Namespaces of the open elements
+        self._text = []   # Text not yet split, which may span feeds
+
+    def close(self):
+        super().close()
+        self._flush_text()
+        while self._stack:
+            self._pop()
+
+    def _get_tag(self, name: str) -> TagTokens:
+        tag = self._tags.get(name)
+        if tag is not None:
+            return tag
+        tag = self._known_tags.get(name)
+        if tag is None:
+            tag = TagTokens.for_tag(name, [
+                NormalizedString(token)
+                for token in self._split(name, Split.TAG_NAME)
+            ])
+        self._tags[name] = tag
+        return tag
+
+    def _get_attr(self, name: str) -> tuple[tuple, Split]:
+        attr = self._attrs.get(name)
+        if attr is not None:
+            return attr
+        tokens = self._known_attrs.get(name)
+        if tokens is None:
+            tokens = ("_", *self._split(name, Split.ATTR_NAME), "=")
+        attr = tokens, self._value_flags.get(name, Split.ATTR_VALUE)
+        self._attrs[name] = attr
+        return attr
+
+    def _pop(self) -> str:
+        """Close the innermost open element, and return its name.
+        """
+        self._namespaces.pop()
+        name = self._stack.pop()
+        self._buf.extend(self._get_tag(name).end)
+        return name
+
+    def _namespace_for(self, tag: str) -> str:
+        if tag in FOREIGN_ATTRIBUTE_NAMES:
+            return tag  # "svg" or "math"
+        if not self._namespaces:
+            return "html"
+        namespace = self._namespaces[-1]
+        if namespace == "svg" and (
+                self._stack[-1] in SVG_HTML_INTEGRATION_POINTS):
+            return "html"
+        return namespace
+
+    def _flush_text(self):
+        if not self._text:
+            return
+        text = "".join(self._text)
+        self._text.clear()
+        if self._stack:
+            flags = self._get_tag(self._stack[-1]).text_flags
+        else:
+            flags = Split.TEXT
+        self._buf.extend(self._split(text, flags))
+
+    def _comment(self, text: str):
+        self._flush_text()
+        buf = self._buf
+        buf.append("<!--")
+        buf.extend(self._split(text, Split.COMMENT))
+        buf.append("-->")
+
+    # HTMLParser callbacks
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        buf = self._buf
+        stack = self._stack
+        namespace = self._namespace_for(tag)
+        if namespace != "html":
+            attr_names = FOREIGN_ATTRIBUTE_NAMES[namespace]
+        elif (closes := IMPLIED_END_TAGS.get(tag)) is not None:
+            while stack and stack[-1] in closes:
+                self._pop()
+        start_tag = self._get_tag(tag)
+        buf.extend(start_tag.start)
+        for name, value in attrs:
+            if namespace != "html":
+                name = attr_names.get(name, name)
+            tokens, flags = self._get_attr(name)
+            buf.extend(tokens)
+            if value:
+                buf.extend(self._split(value, flags))
+        buf.append(">")
+        if start_tag.end:
+            stack.append(tag)
+            self._namespaces.append(namespace)
+
+    def handle_startendtag(self, tag, attrs):
+        depth = len(self._stack)
+        self.handle_starttag(tag, attrs)
+        if len(self._stack) > depth and self._namespaces[-1] != "html":
+            self._pop()  # Browsers leave <div/> open
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        if tag not in self._stack:
+            return  # Browsers ignore these
+        while self._pop() != tag:
+            pass
+
+    def handle_data(self, data):
+        self._text.append(data)
+
+    def handle_comment(self, data):
+        self._comment(data)
+
+    def handle_decl(self, decl):
+        match = _DOCTYPE_RE.match(decl)
+        if match is None:
+            self._comment(decl)  # Browsers make these comments
+            return
+        self._flush_text()
+        buf = self._buf
+        buf.append("<!DOCTYPE")
+        buf.extend(self._split(match["name"].lower(), Split.DOCTYPE))
+        if (public_id := match["public"]) is not None:
+            buf.append("PUBLIC")
+            buf.extend(self._split(public_id[1:-1], Split.DOCTYPE))
+        if (system_id := match["system"]) is not None:
+            buf.extend(self._split(system_id[1:-1], Split.DOCTYPE))
+        buf.append(">")
+
+    def handle_pi(self, data):
+        self._comment(f"?{data}")  # As browsers do
+
+    def unknown_decl(self, data):
+        self._comment(f"[{data}]")  # As browsers do, for CDATA
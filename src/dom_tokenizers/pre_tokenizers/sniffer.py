@@ -0,0 +1,77 @@
+import zlib
+
+from functools import lru_cache
+from typing import Optional
+
+try:
+    import magic
+except ImportError:
+    # python-magic isn't installed, or libmagic is missing.
+    magic = None
+
+# (offset, signature, format) for the formats the splitter reports.
+SIGNATURES = (
+    (0, b"GIF87a", "GIF"),
+    (0, b"GIF89a", "GIF"),
+    (0, b"\xff\xd8\xff", "JPEG"),
+    (8, b"WEBP", "webp"),  # after b"RIFF" and a 4-byte length
+    (0, b"wOFF", "woff"),
+    (0, b"wOF2", "woff"),
+)
+
+# How much of the data libmagic gets to see.
+MAGIC_PREFIX_SIZE = 2048
+
+
+def sniff_binary(data: bytes) -> Optional[str]:
+    """Return the format of binary `data` as reported by the splitter
+    ("GIF", "JPEG", "webp", "woff" or "zlib"), or None if it's none
+    of those.  Data the built-in signatures don't recognize is passed
+    to libmagic, if available.
+    """
+    if (format := sniff_signature(data)) is not None:
+        return format
+    if _is_zlib(data):
+        return "zlib"
+    return _sniff_with_libmagic(data[:MAGIC_PREFIX_SIZE])
+
+
+def sniff_signature(data: bytes) -> Optional[str]:
+    """Return the format of binary `data` if it starts with one of
+    the built-in signatures, or None if it doesn't.
+    """
+    for offset, signature, format in SIGNATURES:
+        if data.startswith(signature, offset):
+            if format != "webp" or data.startswith(b"RIFF"):
+                return format
+    return None
+
+
+def _is_zlib(data: bytes) -> bool:
+    if len(data) < 2 or data[0] != 0x78:
+        return False
+    if int.from_bytes(data[:2], "big") % 31:
+        return False  # bad header checksum
+    if data[1] & 0x20:
+        return False  # preset dictionary
+    decompressor = zlib.decompressobj()
+    try:
+        # Insist on some output, to avoid matching random data.
+        return bool(decompressor.decompress(data[:64])) or decompressor.eof
+    except zlib.error:
+        return False
+
+
+@lru_cache(maxsize=4096)
+def _sniff_with_libmagic(prefix: bytes) -> Optional[str]:
+    if magic is None:
+        return None
+    full_magic = magic.from_buffer(prefix)
+    easy_magic = full_magic.split(maxsplit=1)[0]
+    if easy_magic in {"GIF", "zlib", "JPEG"}:
+        return easy_magic
+    if " Web/P image" in full_magic:
+        return "webp"
+    if full_magic.startswith("Web Open Font Format"):
+        return "woff"
+    return None
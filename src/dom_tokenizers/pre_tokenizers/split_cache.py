@@ -0,0 +1,118 @@
+import sys
+import threading
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import chain
+
+from .splitter import TextSplitter, Flags
+
+DEFAULT_MAX_ENTRIES = 1 << 16
+DEFAULT_MAX_SIZE = 64 << 20
+
+
+@dataclass
+class SplitCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    size: int = 0
+    assembled: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class SplitCache:
+    """Size-bounded cache of `TextSplitter.split` results, keyed on
+    the split text and the flags it was split with.  Entries are
+    evicted least-recently-used first whenever the cache holds more
+    than `max_entries` entries or more than `max_size` bytes (as
+    reported by `sys.getsizeof`) of keys and values.  Results too
+    big to fit in an empty cache are not cached at all.
+
+    If `cache_words` is True, text the splitter says splits the same
+    a word at a time is split a word at a time, so values like class
+    lists that are unique as strings are put together from entries
+    for words they share with others.
+
+    Caches are safe to share between threads, as `encode_batch` does.
+    """
+    def __init__(
+            self,
+            splitter: TextSplitter,
+            *,
+            max_entries: int = DEFAULT_MAX_ENTRIES,
+            max_size: int = DEFAULT_MAX_SIZE,
+            cache_words: bool = False,
+    ):
+        if max_entries < 0:
+            raise ValueError(max_entries)
+        if max_size < 0:
+            raise ValueError(max_size)
+        self._splitter = splitter
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.cache_words = cache_words
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = SplitCacheStats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def split(self, text: str, flags: Flags = Flags.FULL) -> tuple[str]:
+        """Return `self._splitter.split(text, flags)` as a tuple,
+        from the cache if possible.
+        """
+        key = (text, flags)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return entry[0]
+
+        if self.cache_words and (words := self._splitter.whitespace_words(
+                text, flags)) is not None and len(words) > 1:
+            with self._lock:
+                self.stats.assembled += 1
+            return tuple(chain.from_iterable(
+                self.split(word, flags) for word in words))
+
+        # Split without the lock, so other threads aren't held up.
+        tokens = tuple(self._splitter.split(text, flags))
+        size = sys.getsizeof(text) + sys.getsizeof(tokens) + sum(
+            sys.getsizeof(token) for token in tokens)
+
+        with self._lock:
+            self.stats.misses += 1
+            if size > self.max_size or not self.max_entries:
+                return tokens
+            if key in self._entries:
+                return tokens  # Another thread cached it meanwhile
+            self._entries[key] = (tokens, size)
+            self.stats.entries += 1
+            self.stats.size += size
+            self._evict()
+        return tokens
+
+    def _evict(self):
+        stats = self.stats
+        while stats.entries > self.max_entries or stats.size > self.max_size:
+            _, (_, size) = self._entries.popitem(last=False)
+            stats.entries -= 1
+            stats.size -= size
+            stats.evictions += 1
+
+    def clear(self):
+        """Remove all entries from the cache.  The hit, miss and
+        eviction counters are not reset.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.stats.entries = 0
+            self.stats.size = 0
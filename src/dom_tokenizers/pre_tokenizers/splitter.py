@@ -1,20 +1,31 @@
+import codecs
 import logging
 import re
+import string
+import sys
+import time
 
-from collections import defaultdict
-from collections.abc import Iterable
-from dataclasses import dataclass
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
 from enum import Flag, auto
-from urllib.parse import unquote
-
-import magic
-
-from unidecode import unidecode
-from vec64 import base64_symbol_indexes
+from functools import lru_cache
+from itertools import chain, islice
+from typing import NamedTuple, Optional
+from urllib.parse import unquote, urlsplit
 
 from ..internal import json
 from ..internal.base64 import b64decode
-from .base64 import base64_probability
+from . import branch_stats
+from .base64 import (
+    base64_probabilities,
+    base64_probability,
+    symbol_coincidences,
+)
+from .branch_stats import BranchTracer
+from .lexers import CSS_LEXEME_RE, JS_LEXEME_RE
+from .sniffer import sniff_binary, sniff_signature
+from .transliterate import transliterate
 
 logger = logging.getLogger(__name__)
 debug = logger.debug
@@ -28,8 +39,13 @@ class Flags(Flag):
     UNQUOTE_URLS = auto()  # Decode URL encoding
     SUB_ENTITIES = auto()  # Decode HTML entities
     SNIFF_BASE64 = auto()  # Detect and substitute base64
+    SPLIT_URLS = auto()    # Split as whitespace-separated URLs
+    SPLIT_CSS_URLS = auto()  # Split CSS url() arguments as URLs
+    LEX_JS = auto()        # Lex as JavaScript, splitting only literals
+    LEX_CSS = auto()       # Lex as CSS, splitting only literals
 
     FULL = UNESCAPE_JS | UNQUOTE_URLS | SUB_ENTITIES | SNIFF_BASE64
+    STRUCTURED = SPLIT_URLS | SPLIT_CSS_URLS | LEX_JS | LEX_CSS
 
     TAG_NAME = LOWERCASE
     ATTR_NAME = BASIC
@@ -37,6 +53,10 @@ class Flags(Flag):
     TEXT = FULL
     COMMENT = FULL  # XXX maybe... or BASIC? SUB_ENTITIES??
     DOCTYPE = BASIC
+    URL_ATTR_VALUE = ATTR_VALUE | SPLIT_URLS
+    STYLE_ATTR_VALUE = ATTR_VALUE | SPLIT_CSS_URLS
+    SCRIPT_TEXT = TEXT | LEX_JS
+    STYLE_TEXT = TEXT | LEX_CSS
 
 
 class MandatorySplit:  # pragma: no cover
@@ -51,10 +71,100 @@ class FalseBase64Error(RuntimeError):
     pass
 
 
+class Span(NamedTuple):
+    """Where a token came from in the text it was split from, and the
+    token itself if it isn't simply `text[start:end]`.
+    """
+    start: int
+    end: int
+    replacement: Optional[str] = None
+
+    def token(self, text: str) -> str:
+        if self.replacement is not None:
+            return self.replacement
+        return text[self.start:self.end]
+
+
+@dataclass
+class SplitBudget:
+    """Limits on the work `TextSplitter.split` does on any one string.
+    Text longer than `max_length` characters is split the cheap way
+    `fallback` names instead, as is whatever's left of text still
+    being split after `max_iterations` trips round the splitting loop
+    or `max_seconds` seconds.  Each time, `on_degraded` is called with
+    the reason ("length", "iterations" or "time") and the text.
+    """
+    max_length: Optional[int] = None
+    max_iterations: Optional[int] = None
+    max_seconds: Optional[float] = None
+    fallback: str = "nonword"
+    on_degraded: Optional[Callable[[str, str], None]] = None
+
+    # Cheap ways to split text once the budget for it is spent.
+    # "nonword" splits on non-word characters, and "long" replaces
+    # it all with `TextSplitter.long_token`.
+    FALLBACKS = ("nonword", "long")
+
+    # How many trips round the splitting loop between checks.
+    CHECK_INTERVAL = 64
+
+    def __post_init__(self):
+        if self.fallback not in self.FALLBACKS:
+            raise ValueError(f"unknown fallback {self.fallback!r}")
+
+    def deadline(self) -> Optional[float]:
+        """Return when time runs out for text started now, if ever."""
+        if self.max_seconds is None:
+            return None
+        return time.monotonic() + self.max_seconds
+
+    def next_check(self, iterations: int) -> int:
+        """Return the iteration to next call `exhausted` at."""
+        check_at = iterations + self.CHECK_INTERVAL
+        if self.max_iterations is not None:
+            check_at = min(check_at, self.max_iterations + 1)
+        return check_at
+
+    def exhausted(
+            self,
+            iterations: int,
+            deadline: Optional[float],
+    ) -> Optional[str]:
+        """Return why the budget is spent, or None if it isn't."""
+        if self.max_iterations is not None and (
+                iterations > self.max_iterations):
+            return "iterations"
+        if deadline is not None and time.monotonic() > deadline:
+            return "time"
+        return None
+
+
 @dataclass
 class TextSplitter:
     base64_token: str = "[BASE64]"
     long_token: str = "[LONG]"
+    engine: str = "linear"
+    base64_sniff_limit: int = 4096
+    predecode: bool = True
+    budget: Optional[SplitBudget] = None
+    fast_path_hits: int = field(default=0, init=False, compare=False)
+    _postprocessed: dict[str, tuple[str, ...]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
+
+    # Ways `split` can work through its input.  "linear" reads the
+    # input into the splitting loop only as far as each step needs
+    # (see `_read_input`) and retires finished splits as it goes, so
+    # neither the list it edits nor the strings it re-examines grow
+    # with the input; "reference" is the original implementation,
+    # which splits the whole input in one list, and is retained for
+    # comparison.
+    ENGINES = ("linear", "reference")
+
+    def __post_init__(self):
+        if self.engine not in self.ENGINES:
+            raise ValueError(f"unknown engine {self.engine!r}")
+        if self.base64_sniff_limit < self.SHORTEST_BASE64:
+            raise ValueError(self.base64_sniff_limit)
 
     @property
     def special_tokens(self) -> Iterable[str]:
@@ -120,11 +230,53 @@ class TextSplitter:
         "www",
     }
     LONGEST_PHITEST = 85
+    BASE64_TAIL_SAMPLE = 256
+    UTF8_CONTINUATION_BYTES = bytes(range(0x80, 0xc0))
+    _utf8_decoder = codecs.getincrementaldecoder("utf-8")
     SHORTEST_BASE64 = 24
+
+    # The base64 alphabet characters each split starts with, and up to
+    # two "=" of padding after them, as vec64's base64_symbol_indexes()
+    # counts them.  Matching them finds how many there are without
+    # allocating anything their length, or looking any further.
+    BASE64_PREFIX_RE = re.compile(r"[A-Za-z0-9+/]*={0,2}")
+
     B64_PNG_RE = re.compile(r"iVBORw0KGg[o-r]")
     XML_HDR_RE = re.compile(r"<([a-z]{3,})\s+[a-z]+")
-
-    def split(self, text: str, flags: Flags = Flags.FULL) -> Iterable[str]:
+    SPLIT_LOOKAHEAD = 4
+    SPLIT_WINDOW = 64
+    INPUT_BLOCK = 256
+    SHORTEST_OPEN = 8
+    BASE64_RUN_RE = re.compile(r"[A-Za-z0-9+/=]*")
+
+    WORDISH_RUN_RE = re.compile(rf"[\w{APOSTROPHES}]*")
+    WHITESPACE_RUN_RE = re.compile(r"\s*")
+    BACKSLASH_RUN_RE = re.compile(r"\\*")
+    NONSPACE_RE = re.compile(r"\S+")
+    RETIRE_THRESHOLD = 256
+
+    # Text that's nothing but whitespace-separated ASCII words, none
+    # of which are long enough to sniff for base64 or prefixed hex,
+    # splits into exactly what `str.split` would return, so we can
+    # skip the loop in `split` and go straight to `_postprocess`.
+    _SIMPLE_WORD = rf"(?!0[xX])[0-9A-Za-z]{{1,{SHORTEST_BASE64 - 1}}}"
+    SIMPLE_TEXT_RE = re.compile(
+        rf"[\t-\r ]*(?:{_SIMPLE_WORD}(?:[\t-\r ]+{_SIMPLE_WORD})*[\t-\r ]*)?")
+
+    # Short text that's nothing but whitespace-separated words made of
+    # letters and digits (but not underscores, which "\w" includes),
+    # some of them non-ASCII, splits exactly like the ASCII text its
+    # words transliterate to.
+    WORDS_RE = re.compile(
+        r"[\t-\r ]*(?:[^\W_]+(?:[\t-\r ]+[^\W_]+)*[\t-\r ]*)?")
+
+    # Matching SIMPLE_TEXT_RE takes memory in proportion to the text,
+    # so long text is checked by searching for anything that isn't.
+    NOT_SIMPLE_TEXT_RE = re.compile(
+        rf"[^\t-\r 0-9A-Za-z]|[0-9A-Za-z]{{{SHORTEST_BASE64}}}"
+        rf"|(?<![0-9A-Za-z])0[xX]")
+
+    def split(self, text: str, flags: Flags = Flags.FULL) -> list[str]:
         """Split a string into a sequence of tokens.
 
         It splits on any non-alphanumeric character, but also tries
@@ -134,9 +286,75 @@ class TextSplitter:
         which are just fragments of base64.  It isn't easy though,
         lots of regular text is valid base64, we have to sniff.)
         """
+        result = list(self.iter_split(text, flags))
+        if logger.isEnabledFor(logging.DEBUG):  # pragma: no cover
+            if len(result) < 256:
+                debug("output: %s", " ".join(
+                    f"\x1B[44;36m{split}\x1B[0m"
+                    for split in result
+                ))
+        return result
+
+    def iter_split(
+            self,
+            text: str,
+            flags: Flags = Flags.FULL,
+    ) -> Iterator[str]:
+        """Like `split`, but yield each token as soon as it's final.
+        With the linear engine only a bounded window of the input is
+        held in memory at once, however long `text` is.
+        """
+        if (budget := self.budget) is not None and (
+                budget.max_length is not None
+                and len(text) > budget.max_length):
+            yield from self._iter_split_degraded(
+                "length", text, [text], Flags.LOWERCASE in flags)
+            return
+
+        original_text = text
         if Flags.LOWERCASE in flags:
             text = text.lower()
 
+        if Flags.LEX_JS in flags or Flags.LEX_CSS in flags:
+            yield from self._iter_split_code(text, flags)
+            return
+
+        if Flags.SPLIT_URLS in flags or Flags.SPLIT_CSS_URLS in flags:
+            yield from self._iter_split_urls(text, flags)
+            return
+
+        if Flags.SNIFF_BASE64 in flags and ";base64," in text and (
+                data_uris := self._find_data_uris(text)):
+            yield from self._iter_split_data_uris(text, flags, data_uris)
+            return
+
+        fast_paths = self.engine != "reference"
+        if fast_paths and (
+                words := self._transliterate_words(text)) is not None:
+            text = words
+        is_simple = fast_paths and self._is_simple_text(text)
+
+        # Simple text has no escapes, so only other text is predecoded.
+        if not is_simple and fast_paths and self.predecode and (
+                decoded := self._decode_escapes(text, flags)) is not None:
+            text = decoded
+            flags = _without_decoding(flags)
+            if (words := self._transliterate_words(text)) is not None:
+                text = words
+            is_simple = self._is_simple_text(text)
+
+        if is_simple:
+            self.fast_path_hits += 1
+            if len(text) <= self.INPUT_BLOCK:
+                yield from self._postprocess(text.split())
+                return
+            words = self.NONSPACE_RE.finditer(text)
+            while (batch := [
+                    match.group()
+                    for match in islice(words, self.POSTPROCESS_BATCH)]):
+                yield from self._postprocess(batch)
+            return
+
         unquote_urls = Flags.UNQUOTE_URLS in flags
         unescape_js = Flags.UNESCAPE_JS in flags
         sub_entities = Flags.SUB_ENTITIES in flags
@@ -146,10 +364,58 @@ class TextSplitter:
         if VERBOSE and len(text) < 4096:  # pragma: no cover
             debug("input: \x1B[44;36m%s\x1B[0m", text)
 
-        splits = [text]
+        # Branches are noted only if logged or counted.
+        stats = branch_stats.active
+        if (INSTRUMENTED := VERBOSE or stats is not None):
+            note = BranchTracer(stats, debug if VERBOSE else None)
+            TIMING = note.is_timing
+        else:
+            TIMING = False
+
+        if self.engine == "reference" or len(text) <= self.INPUT_BLOCK:
+            reader = None
+            splits = [text]
+            retire_at = None
+        else:
+            reader = _InputReader(text)
+            splits = [""]
+            retire_at = self.RETIRE_THRESHOLD
+        if budget is not None:
+            deadline = budget.deadline()
+            iterations = 0
+            check_at = budget.next_check(iterations)
+        base64_prefix = self.BASE64_PREFIX_RE.match
         cursor = 0
         last = None
-        while cursor < len(splits):
+        while True:
+            if TIMING:
+                note.lap()
+            if reader is not None:
+                self._read_input(reader, splits, cursor,
+                                 unquote_urls, unescape_js)
+            if cursor >= len(splits):
+                break
+
+            # Fall back to something cheaper if the budget's spent.
+            if budget is not None and (
+                    (iterations := iterations + 1) >= check_at):
+                if (reason := budget.exhausted(
+                        iterations, deadline)) is not None:
+                    yield from self._postprocess(splits[:cursor])
+                    if reader is not None:
+                        reader.read_all(splits)
+                    yield from self._iter_split_degraded(
+                        reason, original_text, splits[cursor:])
+                    return
+                check_at = budget.next_check(iterations)
+
+            # Retire splits that are behind the furthest lookback.
+            if retire_at is not None and cursor > retire_at:
+                limit = cursor - self.URLISH_LOOKBACK
+                yield from self._postprocess(splits[:limit])
+                del splits[:limit]
+                cursor -= limit
+
             this = (cursor, len(splits))
             if this != last:
                 loop = 100
@@ -172,36 +438,36 @@ class TextSplitter:
 
             # Step over mandatory splits
             if curr is SPLIT:
-                if VERBOSE:  # pragma: no cover
-                    debug("it's a split")
+                if INSTRUMENTED:
+                    note("it's a split")
                 cursor += 1
                 continue
 
             # Are we looking at something that might be base64?
-            if (curr64 := base64_symbol_indexes(curr)):
-                if (limit := len(curr64)) != len(curr):
-                    curr64 = b""  # do not process this partial match
+            if (len64 := base64_prefix(curr).end()):
+                if (limit := len64) != len(curr):
+                    len64 = 0  # do not process this partial match
                     nextchar = curr[limit]
 
                     # Avoid splitting apostrophes out of words
                     if nextchar in self.APOSTROPHES and (
                             match := self.WORD_RE.match(curr)):
-                        if VERBOSE:  # pragma: no cover
-                            debug("it's a word with apostrophes")
+                        if INSTRUMENTED:
+                            note("it's a word with apostrophes")
                         word = match.group()
                         if not word.isascii():
-                            word = unidecode(word)
+                            word = transliterate(word)
                             if not word.isascii():  # pragma: no cover
                                 logger.warning("%s: unidecode fail?", word)
-                        new_splits = [word, curr[len(word):]]
+                        new_splits = [word, curr[match.end():]]
                         splits[cursor:cursor+1] = new_splits
                         cursor += 1
                         continue
 
                     # Split unless the next character is non-ASCII
                     if nextchar.isascii():
-                        if VERBOSE:  # pragma: no cover
-                            debug("it's partially base64ish")
+                        if INSTRUMENTED:
+                            note("it's partially base64ish")
                         new_splits = [curr[:limit], curr[limit:]]
                         splits[cursor:cursor+1] = new_splits
                         continue
@@ -212,42 +478,44 @@ class TextSplitter:
                 # Pop empty strings and whitespace
                 cursor, is_changed = _pop_unless_nonempty(curr, cursor, splits)
                 if is_changed:
-                    if VERBOSE:  # pragma: no cover
-                        debug("it's whitespace or splits")
+                    if INSTRUMENTED:
+                        note("it's whitespace or splits")
                     continue
 
                 # Are we looking at URL-encoding (`%xx` escapes)?
                 if unquote_urls and curr == "%":
-                    if VERBOSE:  # pragma: no cover
-                        debug("it's urlencoded")
+                    if INSTRUMENTED:
+                        note("it's urlencoded")
                     cursor = self._sub_urlencoded(splits, cursor)
                     continue
 
                 # Are we looking at Javascript escaping?
                 if unescape_js and curr[0] == "\\":
-                    if VERBOSE:  # pragma: no cover
-                        debug("it's escaped")
+                    if INSTRUMENTED:
+                        note("it's escaped")
                     cursor = self._sub_js_escape(splits, cursor)
                     continue
 
                 # Are we looking at character entities?
                 if sub_entities and curr in self.ENTITY_STARTS:
-                    if VERBOSE:  # pragma: no cover
-                        debug("it's an entity")
+                    if INSTRUMENTED:
+                        note("it's an entity")
                     cursor = self._sub_html_entity(splits, cursor)
                     continue
 
             # Are we looking at some prefixed hex?
-            if len(curr64) > 2 and (match := self.PREFIXED_HEX_RE.match(curr)):
-                if VERBOSE:  # pragma: no cover
-                    debug("prefixed hex")
+            if len64 > 2 and (match := self.PREFIXED_HEX_RE.match(curr)):
+                if INSTRUMENTED:
+                    note("prefixed hex")
                 new_splits = [s for s in match.groups() if s]
                 splits[cursor:cursor+1] = new_splits
                 cursor += len(new_splits)
                 continue
 
             # Are we looking at something that might be base64?
-            if sniff_base64 and len(curr64) >= self.SHORTEST_BASE64:
+            if sniff_base64 and len64 >= self.SHORTEST_BASE64:
+                if INSTRUMENTED:
+                    note("it might be base64")
                 cursor = self._sub_base64(splits, cursor)
                 continue
 
@@ -256,8 +524,8 @@ class TextSplitter:
             # self.WORD_RE will match them otherwise.
             new_splits = curr.split("_", maxsplit=1)
             if len(new_splits) > 1:
-                if VERBOSE:  # pragma: no cover
-                    debug("it's stuff with underscores")
+                if INSTRUMENTED:
+                    note("it's stuff with underscores")
                 splits[cursor:cursor+1] = new_splits
                 continue
 
@@ -265,18 +533,18 @@ class TextSplitter:
             words = self.WORD_RE.findall(curr)
             if len(words) == 1 and words[0] == curr:
                 if not curr.isascii():
-                    unidecoded = unidecode(curr)
+                    unidecoded = transliterate(curr)
                     if unidecoded == curr:  # pragma: no cover
                         debug("it's some non-ASCII that didn't change?")
                         cursor += 1  # skip it
                     else:
-                        if VERBOSE:  # pragma: no cover
-                            debug("it's some non-ASCII")
+                        if INSTRUMENTED:
+                            note("it's some non-ASCII")
                         splits[cursor] = unidecoded
                     continue
 
-                if VERBOSE:  # pragma: no cover
-                    debug("it's a single word")
+                if INSTRUMENTED:
+                    note("it's a single word")
                 cursor += 1
                 continue
             # XXX mpve this split below the next?
@@ -292,8 +560,8 @@ class TextSplitter:
             while start < limit and not new_splits[limit - 1]:
                 limit -= 1
             if limit - start > 1:
-                if VERBOSE:  # pragma: no cover
-                    debug("it's splittable")
+                if INSTRUMENTED:
+                    note("it's splittable")
                 splits[cursor:cursor+1] = new_splits[start:limit]
                 continue
 
@@ -301,27 +569,27 @@ class TextSplitter:
             if not words:
                 # Check for embedded escape sequences
                 if len(curr) > 1 and (m := self.ESCAPE_START_RE.search(curr)):
-                    if VERBOSE:  # pragma: no cover
-                        debug("it's peelable")
+                    if INSTRUMENTED:
+                        note("it's peelable")
                     limit = m.span(1)[0]
                     splits[cursor:cursor+1] = [curr[:limit], curr[limit:]]
                     continue
 
-                if VERBOSE:  # pragma: no cover
-                    debug("it's nonword smush")
+                if INSTRUMENTED:
+                    note("it's nonword smush")
                 splits[cursor] = SPLIT
                 cursor += 1
                 continue
 
             # Do we have some words?
             if words:
-                if VERBOSE:  # pragma: no cover
-                    debug("it's some words")
+                if INSTRUMENTED:
+                    note("it's some words")
                 cursor_limit = cursor + 1
 
                 if cursor_limit < len(splits):
-                    next = splits[cursor_limit]
-                    if next and next is not SPLIT and next[0] not in r"%\&":
+                    after = splits[cursor_limit]
+                    if after and after is not SPLIT and after[0] not in r"%\&":
                         words.append(SPLIT)
 
                 splits[cursor:cursor_limit] = words
@@ -333,16 +601,729 @@ class TextSplitter:
                 print("words:", words)
                 raise NotImplementedError
 
-        result = self._postprocess(splits)
-        if VERBOSE:  # pragma: no cover
-            result = list(result)
-            if len(result) < 256:
-                debug("output: %s", " ".join(
-                    f"\x1B[44;36m{split}\x1B[0m"
-                    for split in result
-                ))
+        if TIMING:
+            note.lap()
+        yield from self._postprocess(splits)
+
+    def split_spans(
+            self,
+            text: str,
+            flags: Flags = Flags.FULL,
+    ) -> list[Span]:
+        """Like `split`, but return the span of `text` each token came
+        from in place of the token.
+        """
+        return list(self.iter_spans(text, flags))
+
+    # Characters no token comes from, that can't start an escape.
+    SPAN_GAP_RE = re.compile(r"(?:[^\w\\%&]|_)*")
+
+    # Non-alphanumeric characters text tokens come from can include:
+    # apostrophes, base64's "+/=", and the ";" entities end with.  A
+    # token found next to one may have come from more than it spans.
+    SPAN_WORDISH = f"{APOSTROPHES}{BASE64_NONWORD};"
+
+    # How long a run of chunks of text that don't split like they do
+    # on their own can get before `iter_spans` stops trying to find
+    # where the tokens after it came from.
+    SPAN_MERGE_LIMIT = 1024
+
+    def iter_spans(
+            self,
+            text: str,
+            flags: Flags = Flags.FULL,
+    ) -> Iterator[Span]:
+        """Like `iter_split`, but yield the span of `text` each token
+        came from in place of the token.  Tokens that are exactly the
+        text they span carry no replacement, so the caller creates them
+        only if it needs them.
+
+        Each whitespace-separated chunk of `text` is matched with the
+        tokens it splits to on its own, merged with the chunks after it
+        until that gives the tokens `iter_split` gives.  Tokens found
+        verbatim at either end of the chunk, with nothing between them
+        that tokens can come from, span exactly the text they came
+        from.  Tokens between those, which decoding, transliteration or
+        substitution changed, each span all the text between those,
+        which is where they came from, together.
+        """
+        source = text
+        if Flags.LOWERCASE in flags:
+            if len(lowered := text.lower()) == len(text):
+                source = lowered
+        tokens = self.iter_split(text, flags)
+        pending = deque()  # tokens from `tokens` not yet located
+        skip_gap = self.SPAN_GAP_RE.match
+        special_tokens = set(self.special_tokens)
+        escape_chars = _escape_chars(flags)
+
+        chunks = self.NONSPACE_RE.finditer(text)
+        for chunk in chunks:
+            start, end = chunk.span()
+
+            # Most chunks are verbatim tokens with gaps between them.
+            located = []
+            pos = start
+            while (pos := skip_gap(source, pos, end).end()) < end:
+                if len(located) == len(pending):
+                    if (token := next(tokens, None)) is None:
+                        break
+                    pending.append(token)
+                token = pending[len(located)]
+                if token in special_tokens or (
+                        not source.startswith(token, pos, end)):
+                    break
+                located.append(pos)
+                pos += len(token)
+            else:
+                for pos in located:
+                    yield self._exact_span(text, pos, pending.popleft())
+                continue
+
+            # Others need splitting on their own.
+            while True:
+                chunk_tokens = list(self.iter_split(text[start:end], flags))
+                while len(pending) < len(chunk_tokens) and (
+                        token := next(tokens, None)) is not None:
+                    pending.append(token)
+                if chunk_tokens == list(islice(pending, len(chunk_tokens))):
+                    break
+                if end - start > self.SPAN_MERGE_LIMIT or (
+                        chunk := next(chunks, None)) is None:
+                    pending.extend(tokens)
+                    yield from self._shared_spans(
+                        text, start, len(text), pending)
+                    return
+                end = chunk.end()
+
+            for _ in chunk_tokens:
+                pending.popleft()
+            yield from self._locate_spans(
+                text, source, start, end, chunk_tokens, escape_chars)
+
+        # Whitespace gives no tokens, so nothing should be left.
+        pending.extend(tokens)
+        yield from self._shared_spans(text, len(text), len(text), pending)
+
+    @staticmethod
+    def _exact_span(text: str, start: int, token: str) -> Span:
+        end = start + len(token)
+        if text.startswith(token, start):
+            return Span(start, end)
+        return Span(start, end, token)  # lowercased
+
+    @staticmethod
+    def _shared_spans(
+            text: str,
+            start: int,
+            end: int,
+            tokens: Iterable[str],
+    ) -> Iterator[Span]:
+        for token in tokens:
+            if text[start:end] == token:
+                yield Span(start, end)
+            else:
+                yield Span(start, end, token)
+
+    def _locate_spans(
+            self,
+            text: str,
+            source: str,
+            start: int,
+            end: int,
+            tokens: list[str],
+            escape_chars: str,
+    ) -> Iterator[Span]:
+        """Yield the spans of `tokens`, which `text[start:end]` splits
+        to, searching `source`, which is `text` or its lowercase.
+        """
+        # Escapes that decode to separators count as gaps.
+        gap_escapes = {}  # start to end
+        gap_escape_ends = {}  # end to start
+        escape_ends = set()
+        for match in self.ESCAPE_RE.finditer(source, start, end):
+            escape = match.group()
+            if escape[0] not in escape_chars:
+                continue
+            escape_ends.add(match.end())
+            if match.start() > start and source[match.start() - 1] == "\\":
+                continue  # it may be escaped itself
+            try:
+                decoded = _decode_escape(escape)
+            except OverflowError:
+                continue
+            if decoded is not None and not any(
+                    char.isalnum() or char in self.WORDISH_NONALNUM
+                    for char in decoded):
+                gap_escapes[match.start()] = match.end()
+                gap_escape_ends[match.end()] = match.start()
+
+        skip_gap_chars = self.SPAN_GAP_RE.match
+        special_tokens = set(self.special_tokens)
+        wordish = self.SPAN_WORDISH
+
+        def trimmable(char):
+            return not (char.isalnum() or char in wordish or char in "_\\%&")
+
+        def skip_gap(pos, limit):
+            while True:
+                pos = skip_gap_chars(source, pos, limit).end()
+                if (after := gap_escapes.get(pos)) is None or after > limit:
+                    return pos
+                pos = after
+
+        def skip_gap_back(pos, limit):
+            while pos > limit:
+                if (before := gap_escape_ends.get(pos)) is not None:
+                    if before < limit:
+                        break
+                    pos = before
+                elif pos in escape_ends:
+                    break
+                elif skip_gap_chars(source, pos - 1, pos).end() != pos:
+                    break
+                else:
+                    pos -= 1
+            return pos
+
+        # Tokens found verbatim from the start...
+        head = start
+        located = 0
+        for token in tokens:
+            pos = skip_gap(head, end)
+            if token in special_tokens or (
+                    not source.startswith(token, pos, end)):
+                break
+            yield self._exact_span(text, pos, token)
+            head = pos + len(token)
+            located += 1
+
+        # ...and from the end, not where they could be part of more.
+        tail = end
+        tail_spans = []
+        for token in reversed(tokens[located:]):
+            pos = skip_gap_back(tail, head) - len(token)
+            if token in special_tokens or pos < head or (
+                    not source.startswith(token, pos)):
+                break
+            if pos > start and pos not in gap_escape_ends and (
+                    source[pos - 1].isalnum() or source[pos - 1] in wordish
+                    or pos in escape_ends):
+                break
+            tail_spans.append(self._exact_span(text, pos, token))
+            tail = pos
+
+        # Anything else came from what's between.
+        middle = tokens[located:len(tokens) - len(tail_spans)]
+        if middle:
+            # Trim only what none of them could have come from.
+            start, end = head, tail
+            while start < end and trimmable(source[start]):
+                start += 1
+            while end > start and trimmable(source[end - 1]):
+                end -= 1
+            yield from self._shared_spans(text, start, end, middle)
+        yield from reversed(tail_spans)
+
+    # Base64 data URIs, with their media types and payloads, that
+    # `_iter_split_data_uris` can split without looking further into.
+    DATA_URI_RE = re.compile(
+        r"\b(?i:(?P<header>data:(?P<media_type>[a-z]+/[a-z0-9.+-]+)"
+        r"(?:;[a-z0-9.+-]+=[a-z0-9.+-]+)*;base64)),"
+        rf"(?P<payload>[A-Za-z0-9+/]{{{SHORTEST_BASE64},}}={{0,2}})"
+        r"(?![\w+/=%\\&]|[^\x00-\x7f])")
+
+    # Media types whose base64 data URIs are trusted, and the tokens
+    # sniffing their data would add after `base64_token`.
+    DATA_URI_HINTS = {
+        "application/font-woff": ("woff",),
+        "application/json": ("json",),
+        "application/x-font-woff": ("woff",),
+        "font/woff": ("woff",),
+        "font/woff2": ("woff",),
+        "image/gif": ("GIF",),
+        "image/jpeg": ("JPEG",),
+        "image/jpg": ("JPEG",),
+        "image/png": ("png",),
+        "image/svg+xml": ("svg",),
+        "image/webp": ("webp",),
+        "text/css": ("utf", "8"),
+        "text/plain": ("utf", "8"),
+    }
+
+    # How much of a data URI's payload is decoded to check its data
+    # is what its media type says.
+    DATA_URI_CHECK_LENGTH = 64
+
+    def _find_data_uris(
+            self,
+            text: str,
+    ) -> list[tuple[re.Match, tuple[str, ...]]]:
+        """Return each base64 data URI in `text` whose media type is
+        trusted and not obviously wrong, with the tokens to follow
+        `base64_token` in its place.
+        """
+        return [
+            (match, hint)
+            for match in self.DATA_URI_RE.finditer(text)
+            if (hint := self._data_uri_hint(
+                    match.group("media_type"),
+                    match.group("payload"))) is not None
+        ]
+
+    def _data_uri_hint(
+            self,
+            media_type: str,
+            payload: str,
+    ) -> Optional[tuple[str, ...]]:
+        if (hint := self.DATA_URI_HINTS.get(media_type.lower())) is None:
+            return None
+        format = hint[0]
+        if format == "png":
+            return hint if self.B64_PNG_RE.match(payload) else None
+        data = b64decode(
+            payload[:self.DATA_URI_CHECK_LENGTH], fix_padding=True)
+        if format not in {"svg", "json", "utf"}:
+            return hint if sniff_signature(data) == format else None
+        try:
+            start = self._utf8_decoder().decode(data).lstrip()[:1]
+        except UnicodeDecodeError:
+            return None
+        if format == "svg" and start != "<":
+            return None
+        if format == "json" and start not in {"{", "["}:
+            return None
+        return hint
+
+    def _iter_split_data_uris(
+            self,
+            text: str,
+            flags: Flags,
+            data_uris: list[tuple[re.Match, tuple[str, ...]]],
+    ) -> Iterator[str]:
+        """Split `text`, replacing the payload of each of `data_uris`
+        with `base64_token` and the tokens its media type implies.
+        """
+        start = 0
+        for match, hint in data_uris:
+            if start < (limit := match.start()):
+                yield from self.iter_split(text[start:limit], flags)
+            yield from self._postprocess(
+                self.ASCII_WORD_RE.findall(match.group("header")))
+            yield self.base64_token
+            yield from hint
+            start = match.end()
+        if start < len(text):
+            yield from self.iter_split(text[start:], flags)
+
+    # Words, for splitting text whose budget is spent.
+    FALLBACK_WORD_RE = re.compile(r"[^\W_]+")
+    ASCII_WORD_RE = re.compile(r"[0-9A-Za-z]+")
+
+    def _iter_split_degraded(
+            self,
+            reason: str,
+            text: str,
+            pieces: Sequence[str],
+            lowercase: bool = False,
+    ) -> Iterator[str]:
+        """Split what's left of `text`, `pieces`, as `self.budget` says
+        to when it's spent, and report the degradation.
+        """
+        budget = self.budget
+        if budget.on_degraded is not None:
+            budget.on_degraded(reason, text)
+        pieces = [piece for piece in pieces if piece is not SPLIT]
+
+        if budget.fallback == "long":
+            if any(piece and not piece.isspace() for piece in pieces):
+                yield self.long_token
+            return
+
+        words = (
+            match.group()
+            for piece in pieces
+            for match in self.FALLBACK_WORD_RE.finditer(piece))
+        if lowercase:
+            words = map(str.lower, words)
+        words = chain.from_iterable(
+            (word,) if word.isascii()
+            else self.ASCII_WORD_RE.findall(transliterate(word))
+            for word in words)
+        while (batch := list(islice(words, self.POSTPROCESS_BATCH))):
+            yield from self._postprocess(batch)
+
+    # Runs of base64 long enough to be sniffed, which looks back at
+    # the words before them for signs they're part of a URL.
+    BASE64_CANDIDATE_RE = re.compile(rf"[A-Za-z0-9+/]{{{SHORTEST_BASE64}}}")
+
+    def whitespace_words(self, text: str, flags: Flags) -> Optional[list[str]]:
+        """Return the whitespace-separated words of `text` if splitting
+        them one at a time gives the same tokens as splitting `text`,
+        or None if it might not, or if splitting `text` is quicker.
+        """
+        if self.budget is not None:
+            return None  # budgets are for whole strings
+        if not text.isascii():
+            return None  # non-ASCII can change how what follows splits
+        if "'" in text and "_" in text:
+            return None  # as can where words with both start
+        if flags & Flags.STRUCTURED:
+            return None
+        for char in _escape_chars(flags):
+            if char in text:
+                return None  # escapes can reach over whitespace
+        if Flags.SNIFF_BASE64 in flags and (
+                self.BASE64_CANDIDATE_RE.search(text)):
+            return None
+        if self._is_simple_text(text):
+            return None  # quicker to split whole
+        return text.split()
+
+    def _is_simple_text(self, text: str) -> bool:
+        if len(text) <= self.INPUT_BLOCK:
+            return self.SIMPLE_TEXT_RE.fullmatch(text) is not None
+        return self.NOT_SIMPLE_TEXT_RE.search(text) is None
+
+    def _transliterate_words(self, text: str) -> Optional[str]:
+        """Return the space-separated transliterations of the words in
+        `text`, or None if `text` isn't words matching `WORDS_RE` with
+        at least one non-ASCII character.
+        """
+        if len(text) > self.INPUT_BLOCK or text.isascii():
+            return None
+        if not self.WORDS_RE.fullmatch(text):
+            return None
+        return " ".join(map(transliterate, text.split()))
+
+    def _iter_split_code(self, text: str, flags: Flags) -> Iterator[str]:
+        """Split `text`, which `Flags.LEX_JS` or `Flags.LEX_CSS` says
+        is JavaScript or CSS, by lexing it in one pass, and splitting
+        only the contents of comments, literals and unusual words with
+        the rest of `flags`.
+        """
+        lexeme_re = JS_LEXEME_RE if Flags.LEX_JS in flags else CSS_LEXEME_RE
+        flags &= ~(Flags.LEX_JS | Flags.LEX_CSS)
+        is_simple = self.SIMPLE_TEXT_RE.fullmatch
+        input_block = self.INPUT_BLOCK
+        batch_size = self.POSTPROCESS_BATCH
+        words = []
+        for match in lexeme_re.finditer(text):
+            kind = match.lastgroup
+            if kind == "word":
+                words.append(match.group(kind))
+                if len(words) >= batch_size:
+                    yield from self._postprocess(words)
+                    words = []
+                continue
+            if kind == "url":
+                words.append(match.group("url_function"))
+
+            # Most comments and literals are simple enough to batch.
+            lexeme = match.group(kind)
+            if len(lexeme) <= input_block and is_simple(lexeme):
+                words.extend(lexeme.split())
+                continue
+
+            if words:
+                yield from self._postprocess(words)
+                words = []
+            yield from self.iter_split(lexeme, flags)
+        if words:
+            yield from self._postprocess(words)
+
+    # CSS `url()` functions, whose arguments are split as URLs when
+    # splitting with `Flags.SPLIT_CSS_URLS`.
+    CSS_URL_RE = re.compile(r"""url\(\s*(["']?)([^"')\s]*)\1\s*\)""", re.I)
+
+    # Separators between the parts of a URL's network location.
+    URL_NETLOC_SEPARATOR_RE = re.compile(r"[.:@\[\]]+")
+
+    # Schemes whose URLs are split as ordinary text, not as URLs.
+    OPAQUE_URL_SCHEMES = {"data", "javascript"}
+
+    def _iter_split_urls(self, text: str, flags: Flags) -> Iterator[str]:
+        """Split `text`, which `Flags.SPLIT_URLS` says is a list of
+        URLs (like `srcset` values, but with their commas optional) or
+        `Flags.SPLIT_CSS_URLS` says may contain CSS `url()` functions,
+        splitting each URL with `_iter_split_url`.
+        """
+        split_css_urls = Flags.SPLIT_CSS_URLS in flags
+        flags &= ~(Flags.LOWERCASE | Flags.SPLIT_URLS | Flags.SPLIT_CSS_URLS)
+        if not split_css_urls:
+            for url in text.split():
+                yield from self._iter_split_url(url.strip(","), flags)
+            return
+
+        start = 0
+        for match in self.CSS_URL_RE.finditer(text):
+            yield from self.iter_split(text[start:match.start(2)], flags)
+            yield from self._iter_split_url(match.group(2), flags)
+            start = match.end(2)
+        yield from self.iter_split(text[start:], flags)
+
+    def _iter_split_url(self, url: str, flags: Flags) -> Iterator[str]:
+        """Split `url` into its scheme, network location parts, path
+        segments, query keys and values, and fragment, and split each
+        of those with `flags`.  Only query values and fragments, the
+        parts of a URL that carry arbitrary data, are sniffed for
+        base64; URLs that don't parse, and URLs with schemes in
+        `OPAQUE_URL_SCHEMES`, are split as ordinary text.
+        """
+        try:
+            scheme, netloc, path, query, fragment = urlsplit(url)
+        except ValueError:  # e.g. unbalanced brackets around IPv6 hosts
+            scheme = None
+        if scheme is None or scheme in self.OPAQUE_URL_SCHEMES:
+            yield from self.iter_split(url, flags)
+            return
+
+        structural_flags = flags & ~Flags.SNIFF_BASE64
+        for piece in chain(
+                (scheme,),
+                self.URL_NETLOC_SEPARATOR_RE.split(netloc),
+                path.split("/")):
+            if piece:
+                yield from self.iter_split(piece, structural_flags)
+
+        for parameter in query.split("&"):
+            key, _, value = parameter.partition("=")
+            if key:
+                yield from self.iter_split(key, structural_flags)
+            if value:
+                yield from self.iter_split(value, flags)
+
+        if fragment:
+            yield from self.iter_split(fragment, flags)
+
+    # Escapes `_decode_escapes` decodes.  `%xx` escapes are matched in
+    # runs, because they may encode multi-byte UTF-8 sequences, and
+    # backslashes in runs, because multiply-escaped text is unescaped
+    # as if it were singly escaped.  Backslashes with just one more
+    # character after them are matched alone, so they can be declined:
+    # the splitter drops both as a terminal backslash.
+    ESCAPE_RE = re.compile(
+        r"%[0-9A-Fa-f]{2}(?:%[0-9A-Fa-f]{2})*"
+        r"|\\+(?:(?=(?s:.)\Z)|x[0-9A-Fa-f]{2}|u[0-9A-Fa-f]{4}|[bfnrtv0']"
+        rf"|(?=[\w{APOSTROPHES}{BASE64_NONWORD}])|\Z)"
+        r"|&#?[^\W_]+;")
+    ASCII_ALNUM = string.ascii_letters + string.digits
+    WORDISH_NONALNUM = f"_{APOSTROPHES}{BASE64_NONWORD}"
+
+    def _decode_escapes(self, text: str, flags: Flags) -> Optional[str]:
+        """Return `text` with the escapes `flags` says to decode
+        decoded in one scan, such that splitting the result without
+        decoding gives the same tokens as splitting `text` would, or
+        None if that can't be done.  Text with underscores, which are
+        split before anything is decoded, or with escapes the splitter
+        handles in ways that depend on their surroundings, can't be,
+        and nor can text longer than `INPUT_BLOCK`, to keep the memory
+        `iter_split` uses bounded.  The linear engine splits the result,
+        if any, when `predecode` is set, rather than decoding piece by
+        piece as it splits.
+        """
+        if len(text) > self.INPUT_BLOCK or "_" in text:
+            return None
+        escape_chars = _escape_chars(flags)
+        if not any(map(text.__contains__, escape_chars)):
+            return None
+        if "\\" in escape_chars and text[-2:-1] == "\\":
+            return None  # the splitter drops terminal backslashes
+        check_escape_chars = len(escape_chars) < len(ESCAPE_CHARS)
+
+        # The splitter decodes an escape after it's processed the piece
+        # before it, then merges the two.  That's the same as processing
+        # the merged piece only if processing left the piece before as
+        # it was, which we know it does if it's a short ASCII word that
+        # isn't prefixed hex.  `tail` is the run of alphanumerics the
+        # result ends with, or None if it ends with other characters
+        # `FIRST_SPLIT_RE` doesn't split.
+        ascii_alnum = self.ASCII_ALNUM
+        wordish_nonalnum = self.WORDISH_NONALNUM
+        longest_tail = self.SHORTEST_BASE64 - 1
+        terminal_backslash_end = len(text) - 1
+        result = []
+        tail = ""
+        start = 0
+        for match in self.ESCAPE_RE.finditer(text):
+            escape = match.group()
+            if check_escape_chars and escape[0] not in escape_chars:
+                continue
+            if (limit := match.start()) != start:
+                chunk = text[start:limit]
+                result.append(chunk)
+                if (before := chunk.rstrip(ascii_alnum)):
+                    last = before[-1]
+                    if last.isalnum() or last in wordish_nonalnum:
+                        return None
+                    if last == "\n" and len(before) == len(chunk):
+                        return None  # ESCAPE_START_RE's "." skips these
+                    tail = chunk[len(before):]
+                elif tail is None:
+                    return None
+                else:
+                    tail += chunk
+            elif tail is None:
+                return None
+            if len(tail) > longest_tail or tail[:2] in ("0x", "0X"):
+                return None
+
+            start = match.end()
+            if start == terminal_backslash_end and escape[-1] == "\\":
+                return None
+            try:
+                decoded = _decode_escape(escape)
+            except OverflowError:
+                return None
+            if decoded is None:
+                return None
+            result.append(decoded)
+
+            last = decoded[-1]
+            if not (last.isalnum() or last in wordish_nonalnum):
+                tail = ""
+            elif decoded.isascii() and decoded.isalnum():
+                tail += decoded
+            else:
+                tail = None
+
+        result.append(text[start:])
+        result = "".join(result)
+        for char in escape_chars:
+            if char in result:
+                return None
         return result
 
+    def _read_input(self, reader, splits, cursor, unquote_urls, unescape_js):
+        """Move input from `reader` into `splits` until everything the
+        next step of `split` will look at is there, and will be split
+        the same as if all the input had been read.  Splits too far
+        ahead of `cursor` to matter are moved back into `reader`.
+        """
+        if len(splits) - cursor > self.SPLIT_WINDOW:
+            limit = cursor + self.SPLIT_LOOKAHEAD + 1
+            reader.unread(splits[limit:])
+            del splits[limit:]
+        reader.feed(splits, cursor + self.SPLIT_LOOKAHEAD)
+        self._read_open_split(reader, splits, cursor, unescape_js)
+
+        # `_sub_urlencoded` works through any number of "%xx" escapes,
+        # and looks at one split either side of them.
+        if unquote_urls and cursor < len(splits) and splits[cursor] == "%":
+            index = cursor
+            while True:
+                reader.feed(splits, index + 2)
+                self._read_open_split(reader, splits, cursor, unescape_js)
+                if index + 1 >= len(splits) or splits[index] != "%":
+                    break
+                if not self._is_twohex(splits[index + 1]):
+                    break
+                index += 2
+
+    def _is_twohex(self, split) -> bool:
+        return (split is not SPLIT
+                and len(split) == 2
+                and self.TWOHEX_RE.match(split) is not None)
+
+    def _read_open_split(self, reader, splits, cursor, unescape_js):
+        """Read enough input into the open split (the one the unread
+        input continues) that the next step of `split` won't split it
+        any differently than it would if all the input had been read.
+        """
+        if not reader.is_open:
+            return
+        if cursor < len(splits) - 1:
+            # The open split is only looked at as a neighbour.
+            if len(splits[-1]) < self.SHORTEST_OPEN:
+                reader.read(splits, self.INPUT_BLOCK)
+            return
+
+        while reader.is_open:
+            curr = splits[-1]
+            if len(curr) < self.SHORTEST_OPEN:
+                reader.read(splits, self.INPUT_BLOCK)
+                continue
+
+            if (limit := self.BASE64_PREFIX_RE.match(curr).end()) == len(curr):
+                reader.read_past(splits, self.BASE64_RUN_RE, self.INPUT_BLOCK)
+                continue
+            if limit:
+                nextchar = curr[limit]
+                if nextchar in self.APOSTROPHES and (
+                        match := self.WORD_RE.match(curr)):
+                    if match.end() < len(curr):
+                        return
+                    reader.read_past(
+                        splits, self.WORDISH_RUN_RE, self.INPUT_BLOCK)
+                    continue
+                if nextchar.isascii():
+                    return
+            elif curr[0].isspace():
+                if curr.lstrip():
+                    return
+                # The next step strips it, so skip rather than read.
+                splits[-1] = curr[0]
+                reader.skip(self.WHITESPACE_RUN_RE)
+                reader.read(splits, self.INPUT_BLOCK)
+                continue
+            elif unescape_js and curr[0] == "\\":
+                if len(curr.lstrip("\\")) >= self.SHORTEST_OPEN:
+                    return
+                reader.read_past(
+                    splits, self.BACKSLASH_RUN_RE, self.INPUT_BLOCK)
+                continue
+
+            # The next step may split `curr` at its first underscore.
+            if "_" not in curr and not self._defer_first_split(reader, splits):
+                reader.read_through_underscore(splits)
+            return
+
+    def _defer_first_split(self, reader, splits) -> bool:
+        """Split the open split on `self.FIRST_SPLIT_RE` as far as its
+        next underscore, putting the first few splits into `splits` and
+        leaving the rest to be split as `reader` feeds them in.  This
+        is what the next two steps of `split` would do if all the input
+        were read, without reading it.  Return False, having done
+        nothing, unless the next underscore is far enough away for it
+        to be worthwhile.
+        """
+        limit = reader.find_underscore()
+        if limit - reader.pos <= self.INPUT_BLOCK:
+            return False
+        match = self.FIRST_SPLIT_RE.search(reader.text, reader.pos, limit)
+        if match is None or match.end() >= limit:
+            return False
+
+        # Read to the end of the first nonword run in the input,
+        # so the split after it is the same as when it's all read.
+        reader.read(splits, match.end() - reader.pos)
+        new_splits = self.FIRST_SPLIT_RE.split(splits.pop())
+        start = 0
+        stop = len(new_splits)
+        while start < stop and not new_splits[start]:
+            start += 1
+        while start < stop and not new_splits[stop - 1]:
+            stop -= 1
+        splits.extend(new_splits[start:stop])
+        deferred = self._iter_first_splits(reader.text, reader.pos, limit)
+        if limit < len(reader.text):
+            reader.defer(deferred, limit + 1)
+        else:
+            reader.defer(deferred, None)
+        return True
+
+    def _iter_first_splits(self, text, start, limit):
+        """Yield `self.FIRST_SPLIT_RE.split(text[start:limit])`, less
+        any empty first and last splits.
+        """
+        for match in self.FIRST_SPLIT_RE.finditer(text, start, limit):
+            if match.start() > start:
+                yield text[start:match.start()]
+            yield match.group()
+            start = match.end()
+        if start < limit:
+            yield text[start:limit]
+
     def _sub_js_escape(self, splits, cursor):
         curr = splits[cursor]
         cursor_limit = cursor + 1
@@ -497,9 +1478,10 @@ class TextSplitter:
             if self._is_urlish_looking_base64(splits, cursor):
                 raise FalseBase64Error("part of a URL")
 
-            # XXX work around a test failure that's happens because vec64
-            # doesn't enforce correct padding like self.BASE64_RE did but
-            # we don't have the all new is-this-base64 checks it needs yet.
+            # XXX work around a test failure that's happens because
+            # BASE64_PREFIX_RE doesn't enforce correct padding like
+            # self.BASE64_RE did but we don't have the all new
+            # is-this-base64 checks it needs yet.
             if (t := len(curr)) & 3 and t < self.MAXWORDLEN and curr.isalnum():
                 raise FalseBase64Error("probably just a word")
 
@@ -573,6 +1555,8 @@ class TextSplitter:
         # Lots of false-positives here, try sniffing
         if self.B64_PNG_RE.match(encoded):
             return [self.base64_token, "png"]
+        if len(encoded) > self.base64_sniff_limit:
+            return self._enter_giant_base64(encoded)
         data = b64decode(encoded, fix_padding=True)
         try:
             text = data.decode("utf-8")
@@ -582,13 +1566,43 @@ class TextSplitter:
             return self._enter_base64_utf8(text)
         return self._enter_base64_binary(data, encoded)
 
-    def _enter_base64_utf8(self, text):
+    def _enter_giant_base64(self, encoded):
+        """Classify `encoded` without decoding all of it, by decoding
+        its first `self.base64_sniff_limit` characters (rounded down
+        to a whole number of 4-character groups) and a sample of its
+        last `self.BASE64_TAIL_SAMPLE` characters.
+        """
+        limit = self.base64_sniff_limit & ~3
+        data = b64decode(encoded[:limit])
+        start = max(limit, (len(encoded) - self.BASE64_TAIL_SAMPLE) & ~3)
+        tail = b64decode(encoded[start:], fix_padding=True)
+        try:
+            text = self._utf8_decoder().decode(data, final=False)
+            # The sample may start part-way through a character.
+            tail = tail.lstrip(self.UTF8_CONTINUATION_BYTES).decode("utf-8")
+        except UnicodeDecodeError:
+            text = None
+        if text is not None:
+            return self._enter_base64_utf8(text, tail)
+        return self._enter_base64_binary(data, encoded)
+
+    def _enter_base64_utf8(self, text, tail=None):
+        """Classify base64-encoded UTF-8 `text`.  If `tail` is given
+        then `text` is a prefix of the decoded data and `tail` is a
+        sample from its end.
+        """
         # XXX recurse??
         match = self.XML_HDR_RE.match(text)
         if match is not None:
             if match.group(1) == "svg":
                 return [self.base64_token, "svg"]
             return [self.base64_token, "xml"]
+        if tail is not None:
+            # Too big to parse, but does it look like it's delimited?
+            delims = text.lstrip()[:1] + tail.rstrip()[-1:]
+            if delims in {"{}", "[]"}:
+                return [self.base64_token, "json"]
+            return [self.base64_token, "utf-8"]
         try:
             _ = json.loads(text)
             return [self.base64_token, "json"]
@@ -598,21 +1612,13 @@ class TextSplitter:
 
     def _enter_base64_binary(self, data, encoded):
         # Not out of false-positive territory yet
-        full_magic = magic.from_buffer(data)
-        easy_magic = full_magic.split(maxsplit=1)[0]
-        if easy_magic in {"GIF", "zlib", "JPEG"}:
-            return [self.base64_token, easy_magic]
-        if " Web/P image" in full_magic:
-            return [self.base64_token, "webp"]
-        if full_magic.startswith("Web Open Font Format"):
-            return [self.base64_token, "woff"]
+        format = sniff_binary(data)
+        if format is not None:
+            return [self.base64_token, format]
         if len(encoded) > self.LONGEST_PHITEST:
             return [self.base64_token]
         # phi test for monoalphabeticity
-        hist = defaultdict(int)
-        for symbol in encoded:
-            hist[symbol] += 1
-        phi_o = sum(freq * (freq - 1) for freq in hist.values())
+        phi_o = symbol_coincidences(encoded)
         N = len(encoded)
         phi_r = N * (N - 1) / 64
         # non-standard comparison (observed phi >= twice random)
@@ -620,41 +1626,150 @@ class TextSplitter:
             raise FalseBase64Error("text")
         return [self.base64_token]
 
-    def _postprocess(self, tokens: Iterable[str]) -> Iterable[str]:
-        for token in tokens:
-            if token is SPLIT:
-                continue
+    # `_postprocess` scores its input for base64 in batches of at most
+    # this many tokens, so the memory it uses doesn't grow with the input.
+    POSTPROCESS_BATCH = 1024
 
-            # self.WORD_RE allows words to end with apostrophes, which
-            # is desirable during processing so as not to strip them
-            # while we're part-way through building words from escaped
-            # characters, but we have to drop them them from the final
-            # tokenizer output to avoid filling the vocabulary with
-            # terminal-quotes.
-            token = token.rstrip("'")
+    # Tokens this short are never replaced with `self.base64_token`.
+    LONGEST_NOT_BASE64 = 4
 
-            if self.HEX_RE.match(token):
-                yield self.long_token
-                try:
-                    _ = int(token)
-                except ValueError:
-                    yield "hex"
-                yield "digits"
-                continue
+    def _postprocess(self, tokens: Sequence[str]) -> Iterable[str]:
+        if len(tokens) > self.POSTPROCESS_BATCH:
+            limit = self.POSTPROCESS_BATCH
+            for start in range(0, len(tokens), limit):
+                yield from self._postprocess(tokens[start:start + limit])
+            return
 
-            if len(token) > 4 and base64_probability(token) >= 0.92:
-                yield self.base64_token
-                continue
+        postprocessed = self._postprocessed
+        if len(postprocessed) >= self.POSTPROCESSED_CACHE_SIZE:
+            postprocessed.clear()  # before _classify_base64 skips any
 
-            if len(token) <= self.MAXWORDLEN:
-                yield token
-                continue
+        if len(tokens) < self.SHORTEST_BASE64_BATCH:
+            is_base64 = None
+        else:
+            is_base64 = self._classify_base64(tokens)
 
-            yield self.long_token
-            if self.DIGIT_RE.search(token):
-                yield "alphanumeric"
-            else:
-                yield "alphabetic"
+        for token in tokens:
+            if token is SPLIT:
+                continue
+            if (result := postprocessed.get(token)) is None:
+                result = postprocessed[token] = self._postprocess_token(
+                    token, is_base64)
+            yield from result
+
+    # How many tokens `_postprocess` remembers the output for, give or
+    # take a batch.  The cache is simply emptied when it fills: tokens
+    # that matter repeat often enough to be back in it almost at once.
+    POSTPROCESSED_CACHE_SIZE = 1 << 16
+
+    def _postprocess_token(
+            self,
+            token: str,
+            is_base64: Optional[set[str]],
+    ) -> tuple[str, ...]:
+        # self.WORD_RE allows words to end with apostrophes, which
+        # is desirable during processing so as not to strip them
+        # while we're part-way through building words from escaped
+        # characters, but we have to drop them them from the final
+        # tokenizer output to avoid filling the vocabulary with
+        # terminal-quotes.
+        token = token.rstrip("'")
+
+        if self.HEX_RE.match(token):
+            # HEX_RE only matches ASCII, so this is `int(token)` working.
+            if token.isdigit():
+                return (self.long_token, "digits")
+            return (self.long_token, "hex", "digits")
+
+        if len(token) > self.LONGEST_NOT_BASE64 and (
+                base64_probability(token) >= 0.92
+                if is_base64 is None
+                else token in is_base64):
+            return (self.base64_token,)
+
+        if len(token) <= self.MAXWORDLEN:
+            return (token,)
+
+        if self.DIGIT_RE.search(token):
+            return (self.long_token, "alphanumeric")
+        return (self.long_token, "alphabetic")
+
+    # Below this many candidates scoring them one at a time is faster
+    # than setting up a vectorized batch.
+    SHORTEST_BASE64_BATCH = 16
+
+    def _classify_base64(self, tokens: Sequence[str]) -> Optional[set[str]]:
+        """Return the set of tokens `_postprocess` should replace with
+        `self.base64_token`, or None if there are too few candidates
+        to be worth scoring in a batch.  Tokens it has already cached
+        are skipped, and hex tokens may be included, so check for those
+        first.
+        """
+        postprocessed = self._postprocessed
+        candidates = list({
+            token: None
+            for token in (
+                    token.rstrip("'")
+                    for token in tokens
+                    if token is not SPLIT and token not in postprocessed)
+            if len(token) > self.LONGEST_NOT_BASE64
+        })
+        if len(candidates) < self.SHORTEST_BASE64_BATCH:
+            return None
+        probabilities = base64_probabilities(candidates)
+        return {
+            token
+            for token, probability in zip(candidates, probabilities)
+            if probability >= 0.92
+        }
+
+
+# The escape character of each escape `_decode_escapes` decodes.
+ESCAPE_CHARS = (
+    (Flags.UNQUOTE_URLS, "%"),
+    (Flags.UNESCAPE_JS, "\\"),
+    (Flags.SUB_ENTITIES, "&"),
+)
+
+
+@lru_cache
+def _escape_chars(flags: Flags) -> str:
+    return "".join(char for flag, char in ESCAPE_CHARS if flag in flags)
+
+
+@lru_cache
+def _without_decoding(flags: Flags) -> Flags:
+    for flag, _ in ESCAPE_CHARS:
+        flags &= ~flag
+    return flags
+
+
+@lru_cache(maxsize=4096)
+def _decode_escape(escape: str) -> Optional[str]:
+    """Return what the splitter would decode `escape`, which matched
+    `TextSplitter.ESCAPE_RE`, to, with " " for places it would split,
+    or None if it would leave it as it was.
+    """
+    if escape[0] == "%":
+        return unquote(escape)
+    if escape[0] == "\\":
+        escaped = escape.lstrip("\\")
+        if len(escaped) > 1:
+            return chr(int(escaped[1:], 16))
+        if escaped == "'":
+            return "'"
+        return " "
+    value = escape[1:-1]
+    if value[0] == "#":
+        try:
+            if value[1] in "xX":
+                return chr(int(value[2:], 16))
+            return chr(int(value[1:]))
+        except ValueError:
+            return None
+    if value == "apos":
+        return "'"
+    return " "  # all other named entities split
 
 
 def _pop_unless_nonempty(curr, cursor, splits):
@@ -674,3 +1789,96 @@ def _pop_unless_nonempty(curr, cursor, splits):
     else:
         splits.pop(cursor)
     return cursor, True
+
+
+class _InputReader:
+    """The input `TextSplitter.split` hasn't put in its list of splits
+    yet: whole splits moved out of the list, then any splits deferred
+    with `defer`, then `text[pos:]`, which continues the last split.
+    That split is "open" until all of `text` has been read into it.
+    """
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.queued = deque()
+        self._deferred = None
+        self._reopen = False
+        self._underscore = -1
+
+    @property
+    def is_open(self) -> bool:
+        """True if the open split is the last of the list of splits."""
+        return (not self.queued
+                and self._deferred is None
+                and self.pos < len(self.text))
+
+    def unread(self, splits: list):
+        self.queued.extendleft(reversed(splits))
+
+    def defer(self, splits: Iterator[str], pos: Optional[int]):
+        """Close the open split, and queue `splits` to follow it.  The
+        split after them is open, and continues from `text[pos:]`, or
+        there isn't one if `pos` is None.
+        """
+        self._deferred = splits
+        self._reopen = pos is not None
+        self.pos = len(self.text) if pos is None else pos
+
+    def feed(self, splits: list, index: int):
+        """Move queued splits into `splits` until `splits[index]` exists.
+        """
+        queued = self.queued
+        while len(splits) <= index:
+            if queued:
+                splits.append(queued.popleft())
+            elif self._deferred is not None:
+                split = next(self._deferred, None)
+                if split is not None:
+                    splits.append(split)
+                    continue
+                self._deferred = None
+                if self._reopen:
+                    splits.append("")
+            else:
+                break
+
+    def read_all(self, splits: list):
+        """Move everything left to read into `splits`."""
+        self.feed(splits, sys.maxsize)
+        if self.pos < len(self.text):
+            self._read_to(splits, len(self.text))
+
+    def read(self, splits: list, count: int):
+        """Read `count` more characters into the open split."""
+        self._read_to(splits, self.pos + count)
+
+    def read_past(self, splits: list, pattern: re.Pattern, count: int):
+        """Read the characters `pattern` matches, plus `count` more,
+        into the open split.
+        """
+        self._read_to(splits, pattern.match(self.text, self.pos).end() + count)
+
+    def skip(self, pattern: re.Pattern):
+        """Skip the characters `pattern` matches."""
+        self.pos = pattern.match(self.text, self.pos).end()
+
+    def find_underscore(self) -> int:
+        """Return the index of the next underscore in `text`, or its
+        length if there isn't one.
+        """
+        if self._underscore < self.pos:
+            self._underscore = self.text.find("_", self.pos)
+            if self._underscore < 0:
+                self._underscore = len(self.text)
+        return self._underscore
+
+    def read_through_underscore(self, splits: list):
+        """Read up to and including the next underscore into the open
+        split, or everything if there isn't one.
+        """
+        self._read_to(splits, self.find_underscore() + 1)
+
+    def _read_to(self, splits: list, limit: int):
+        limit = min(limit, len(self.text))
+        splits[-1] += self.text[self.pos:limit]
+        self.pos = limit
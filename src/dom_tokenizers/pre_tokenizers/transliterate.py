@@ -0,0 +1,24 @@
+from functools import lru_cache
+
+from unidecode import unidecode
+
+
+class _CodePointTable(dict):
+    """A `str.translate` table mapping code points to their unidecode
+    transliterations, filled in as each code point is first seen.
+    """
+    def __missing__(self, code_point: int) -> str:
+        result = self[code_point] = unidecode(chr(code_point))
+        return result
+
+
+_code_points = _CodePointTable()
+
+
+@lru_cache(maxsize=1 << 16)
+def transliterate(word: str) -> str:
+    """Return `unidecode(word)`.  Unidecode transliterates each code
+    point independently, so the result is assembled by `str.translate`
+    from a table of code points already seen, and cached per word.
+    """
+    return word.translate(_code_points)
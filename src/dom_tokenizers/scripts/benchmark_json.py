@@ -0,0 +1,104 @@
+import os
+import time
+import warnings
+
+from argparse import ArgumentParser
+from bisect import bisect
+from collections import defaultdict
+
+from datasets import load_dataset
+
+from ..internal import json
+from .defaults import DEFAULT_DATASET, DEFAULT_SPLIT, SEND_BUGS_TO
+
+DEFAULT_REPEAT = 5
+
+# Upper bounds, in bytes, of the snapshot sizes results are grouped by.
+SIZE_CLASSES = (100_000, 1_000_000, 10_000_000)
+
+
+def size_class_label(index: int) -> str:
+    lower = SIZE_CLASSES[index - 1] / 1e6 if index else 0
+    if index == len(SIZE_CLASSES):
+        return f">= {lower:g} MB"
+    return f"{lower:g}-{SIZE_CLASSES[index] / 1e6:g} MB"
+
+
+def benchmark_json(snapshots, backends, repeat=DEFAULT_REPEAT):
+    """Return the best time in seconds each backend took to parse each
+    of `snapshots`, over `repeat` rounds in which each backend parses
+    each snapshot in turn.
+    """
+    original_backend = json.get_backend()
+    best = defaultdict(lambda: [float("inf")] * len(snapshots))
+    try:
+        for _ in range(repeat):
+            for index, serialized in enumerate(snapshots):
+                for backend in backends:
+                    json.set_backend(backend)
+                    start = time.perf_counter()
+                    json.loads(serialized)
+                    elapsed = time.perf_counter() - start
+                    times = best[backend]
+                    times[index] = min(times[index], elapsed)
+    finally:
+        json.set_backend(original_backend)
+    return best
+
+
+def main():
+    parser = ArgumentParser(
+        description="Compare the speed of the available JSON backends.",
+        epilog=f"Report bugs to: <{SEND_BUGS_TO}>.")
+    parser.add_argument(
+        "dataset", metavar="DATASET", nargs="?", default=DEFAULT_DATASET,
+        help=(f"dataset containing the snapshots to parse"
+              f" [default: {DEFAULT_DATASET}]"))
+    parser.add_argument(
+        "-s", "--split", metavar="SPLIT", default=DEFAULT_SPLIT,
+        help=(f"split of the dataset to use"
+              f" [default: {DEFAULT_SPLIT}]"))
+    parser.add_argument(
+        "-n", "--num-inputs", metavar="N", type=int,
+        help="number of snapshots to parse [default: all]")
+    parser.add_argument(
+        "-r", "--repeat", metavar="N", type=int, default=DEFAULT_REPEAT,
+        help=(f"number of times to parse each snapshot, keeping the best"
+              f" [default: {DEFAULT_REPEAT}]"))
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message=r".*resume_download.*")
+
+    dataset = load_dataset(
+        args.dataset,
+        split=args.split,
+        streaming=not os.path.exists(args.dataset))
+    if args.num_inputs is not None:
+        dataset = dataset.take(args.num_inputs)
+    snapshots = [
+        json.dumps(row["dom_snapshot"]).encode("utf-8")
+        for row in dataset
+    ]
+    backends = json.available_backends()
+    results = benchmark_json(snapshots, backends, args.repeat)
+
+    classes = defaultdict(list)
+    for index, serialized in enumerate(snapshots):
+        classes[bisect(SIZE_CLASSES, len(serialized))].append(index)
+    classes = {
+        size_class_label(class_index): classes[class_index]
+        for class_index in sorted(classes)
+    }
+    classes["all"] = list(range(len(snapshots)))
+
+    print(f"{'snapshots':>17} {'count':>5}", end="")
+    for backend in backends:
+        print(f" {backend + ' MB/s':>12}", end="")
+    print()
+    for label, indexes in classes.items():
+        nbytes = sum(len(snapshots[index]) for index in indexes)
+        print(f"{label:>17} {len(indexes):5}", end="")
+        for backend in backends:
+            seconds = sum(results[backend][index] for index in indexes)
+            print(f" {nbytes / seconds / 1e6:12.1f}", end="")
+        print()
@@ -100,12 +100,12 @@ def main():
 
     tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
     DOMSnapshotPreTokenizer.hook_into(tokenizer)
+    tokenize = tokenizer.dom_pre_tokenizer.tokenize_snapshot
 
     for line in open(args.reference).readlines():
         row = json.loads(line)
         source_index = row["source_index"]
-        serialized = json.dumps(row["dom_snapshot"])
-        b = tokenizer.tokenize(serialized)
+        b = tokenize(row["dom_snapshot"])
         a = row["tokenized"]
         if b == a:
             continue
@@ -33,14 +33,14 @@ def main():
 
     tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
     DOMSnapshotPreTokenizer.hook_into(tokenizer)
+    tokenize = tokenizer.dom_pre_tokenizer.tokenize_snapshot
 
     dataset = load_dataset(args.dataset, split=args.split)
     rows = ((row["source_index"], row["dom_snapshot"]) for row in dataset)
-    rows = ((si, ss, json.dumps(ss)) for si, ss in rows)
-    rows = ((len(ser), si, ss, ser) for si, ss, ser in rows)
-    for _, source_index, dom_snapshot, serialized in sorted(rows):
+    rows = ((len(json.dumps(ss)), si, ss) for si, ss in rows)
+    for _, source_index, dom_snapshot in sorted(rows):
         print(json.dumps(dict(
             source_index=source_index,
             dom_snapshot=dom_snapshot,
-            tokenized=tokenizer.tokenize(serialized)
+            tokenized=tokenize(dom_snapshot)
         )))
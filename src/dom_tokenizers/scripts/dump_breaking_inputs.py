@@ -4,7 +4,6 @@ from argparse import ArgumentParser
 
 from datasets import load_dataset
 
-from ..internal import json
 from ..internal.transformers import AutoTokenizer
 from ..pre_tokenizers import DOMSnapshotPreTokenizer
 from .defaults import (
@@ -34,11 +33,11 @@ def main():
     tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
     tokenizer.model_max_length = 1 << 27
     DOMSnapshotPreTokenizer.hook_into(tokenizer)
+    tokenize = tokenizer.dom_pre_tokenizer.tokenize_snapshot
 
     def is_breaking_row(row):
-        tokenizer_input = json.dumps(row["dom_snapshot"])
         try:
-            _ = tokenizer.tokenize(tokenizer_input)
+            _ = tokenize(row["dom_snapshot"])
         except Exception:
             return True
         return False
@@ -10,7 +10,6 @@ from datasets import load_dataset
 from tokenizers import AddedToken
 from tokenizers.pre_tokenizers import WhitespaceSplit
 
-from .internal import json
 from .internal.transformers import AutoTokenizer
 from .pre_tokenizers import DOMSnapshotPreTokenizer
 from .scripts.defaults import (
@@ -41,14 +40,16 @@ def train_tokenizer(
     # whitespace and hope the regular pretokenizer takes it back apart
     # how we need it to.
 
-    new_pretokenizer = base_tokenizer.backend_tokenizer.pre_tokenizer
+    # `dom_pre_tokenizer` is a weak reference, so take the bound method
+    # first: it keeps our pre-tokenizer alive once it's been replaced.
+    new_pretokenize = base_tokenizer.dom_pre_tokenizer.pre_tokenize_snapshot
     base_tokenizer.backend_tokenizer.pre_tokenizer = WhitespaceSplit()
     base_pretokenizer = base_tokenizer.backend_tokenizer.pre_tokenizer
 
-    def futz_input(real_input):
-        pretokenized = new_pretokenizer.pre_tokenize_str(real_input)
+    def futz_input(dom_snapshot):
+        pretokenized = new_pretokenize(dom_snapshot)
         want_tokens = list(chain.from_iterable(
-            token.split() for token, offsets in pretokenized
+            token.split() for token in pretokenized
         ))
         futzed_input = " ".join(want_tokens)
         pretokenized = base_pretokenizer.pre_tokenize_str(futzed_input)
@@ -63,7 +64,7 @@ def train_tokenizer(
                 row.get("source_index", -1),
                 row.get("displayed_url"),
             )
-            yield futz_input(json.dumps(row["dom_snapshot"]))
+            yield futz_input(row["dom_snapshot"])
 
     # Try and get a dataset length, for the progress tracker.
     if corpus_size is None:
@@ -1,3 +1,18 @@
+import pytest
+
+from tokenizers.normalizers import Prepend
+
+from dom_tokenizers import DOMSnapshotPreTokenizer, SplitBudget
+from dom_tokenizers.pre_tokenizers.dom_snapshot import html_name_tokens
+from dom_tokenizers.pre_tokenizers.html import (
+    ATTRIBUTE_NAMES,
+    TAG_NAMES,
+    is_void_element,
+)
+from dom_tokenizers.pre_tokenizers.splitter import TextSplitter
+from dom_tokenizers.pre_tokenizers.splitter import Flags as Split
+from dom_tokenizers.pre_tokenizers.token_buffer import TokenBuffer
+
 from ...util import load_resource, json
 
 
@@ -21,3 +36,251 @@ def test_raw_response_unwrapping(pre_tokenizer):
 
     wrapped_tokens = pre_tokenizer.tokenize(wrapped_snapshot)
     assert wrapped_tokens == regular_tokens
+
+
+@pytest.mark.parametrize(
+    "split_urls,expect_tokens",
+    ((False,
+      ["<", "a", "_", "href", "=", "[BASE64]", "jpg",
+       "_", "title", "=", "[BASE64]", "jpg", ">", "</", "a", ">"]),
+     (True,
+      ["<", "a", "_", "href", "=", "x", "AbCdEfGhIjKlMnOpQrStUvWx", "jpg",
+       "_", "title", "=", "[BASE64]", "jpg", ">", "</", "a", ">"]),
+     ))
+def test_split_urls(split_urls, expect_tokens):
+    """Test that URL attributes are split as URLs only if requested.
+    """
+    value = "/x/AbCdEfGhIjKlMnOpQrStUvWx.jpg"
+    snapshot = json.dumps({
+        "documents": [{
+            "documentURL": 0,
+            "publicId": -1,
+            "systemId": -1,
+            "nodes": {
+                "parentIndex": [-1, 0],
+                "nodeType": [9, 1],
+                "nodeName": [1, 2],
+                "nodeValue": [-1, -1],
+                "attributes": [[], [3, 4, 5, 4]],
+            },
+        }],
+        "strings": ["about:blank", "#document", "A", "href", value, "title"],
+    })
+    pre_tokenizer = DOMSnapshotPreTokenizer(split_urls=split_urls)
+    buf = TokenBuffer()
+    pre_tokenizer.pre_tokenize_dom(buf, snapshot)
+    assert [token.original for token in buf.tokens] == expect_tokens
+
+
+def test_split_budget():
+    """Test that strings exceeding the split budget are degraded.
+    """
+    degradations = []
+    pre_tokenizer = DOMSnapshotPreTokenizer(split_budget=SplitBudget(
+        max_length=4096,
+        fallback="long",
+        on_degraded=lambda *args: degradations.append(args),
+    ))
+    buf = TokenBuffer()
+    pre_tokenizer.pre_tokenize_dom(buf, load_resource("svg-in-base64.json"))
+    tokens = [token.original for token in buf.tokens]
+    assert [reason for reason, _ in degradations] == ["length"]
+    assert len(degradations[0][1]) > 4096
+    assert "[LONG]" in tokens
+    assert "[BASE64]" not in tokens
+
+
+def test_code_text_flags(monkeypatch):
+    """Test that script and style text is lexed as code.
+    """
+    snapshot = json.dumps({
+        "documents": [{
+            "documentURL": 0,
+            "publicId": -1,
+            "systemId": -1,
+            "nodes": {
+                "parentIndex": [-1, 0, 1, 2, 1, 4, 1],
+                "nodeType": [9, 1, 1, 3, 1, 3, 3],
+                "nodeName": [1, 2, 3, 4, 5, 4, 4],
+                "nodeValue": [-1, -1, -1, 6, -1, 7, 8],
+                "attributes": [[], [], [], [], [], [], []],
+            },
+        }],
+        "strings": ["about:blank", "#document", "HTML", "SCRIPT", "#text",
+                    "STYLE", "var x", "p { }", "y"],
+    })
+    split_flags = {}
+    split = TextSplitter.split
+
+    def recording_split(self, text, flags):
+        split_flags[text] = flags
+        return split(self, text, flags)
+
+    monkeypatch.setattr(TextSplitter, "split", recording_split)
+    buf = TokenBuffer()
+    DOMSnapshotPreTokenizer().pre_tokenize_dom(buf, snapshot)
+    assert [token.original for token in buf.tokens] == [
+        "<", "html", ">", "<", "script", ">", "var", "x", "</", "script", ">",
+        "<", "style", ">", "p", "</", "style", ">", "y", "</", "html", ">"]
+    assert split_flags["var x"] == Split.SCRIPT_TEXT
+    assert split_flags["p { }"] == Split.STYLE_TEXT
+    assert split_flags["y"] == Split.TEXT
+
+
+def test_snapshot_entry_points(dom_snapshot_tokenizer):
+    """Test that parsed and UTF-8 encoded snapshots tokenize the same
+    as JSON-serialized ones.
+    """
+    serialized = load_resource("xhtml-1.0.json")
+    snapshot = json.loads(serialized)
+    pre_tokenizer = dom_snapshot_tokenizer.dom_pre_tokenizer
+    expect_tokens = dom_snapshot_tokenizer.tokenize(serialized)
+    expect_ids = dom_snapshot_tokenizer(serialized)["input_ids"]
+    expect_pre_tokens = [
+        token for token, offsets in dom_snapshot_tokenizer
+        .backend_tokenizer.pre_tokenizer.pre_tokenize_str(serialized)
+    ]
+    for dom_snapshot in (snapshot, serialized.encode("utf-8")):
+        assert pre_tokenizer.tokenize_snapshot(dom_snapshot) == expect_tokens
+        assert pre_tokenizer.encode_snapshot(dom_snapshot).ids == expect_ids
+        assert pre_tokenizer.pre_tokenize_snapshot(
+            dom_snapshot) == expect_pre_tokens
+
+
+def test_pre_tokenize_snapshot_normalization(dom_snapshot_tokenizer):
+    """Test that repeated pre-tokens are normalized once each, even
+    if normalizing twice would change them.
+    """
+    serialized = load_resource("raw-browser-response.json")
+    backend_tokenizer = dom_snapshot_tokenizer.backend_tokenizer
+    backend_tokenizer.normalizer = Prepend("_")
+    expect_pre_tokens = [
+        token for token, offsets in
+        backend_tokenizer.pre_tokenizer.pre_tokenize_str(serialized)
+    ]
+    pre_tokenizer = dom_snapshot_tokenizer.dom_pre_tokenizer
+    assert pre_tokenizer.pre_tokenize_snapshot(
+        json.loads(serialized)) == expect_pre_tokens
+
+
+def test_unbound_snapshot_entry_points():
+    """Test that unbound pre-tokenizers emit unnormalized pre-tokens,
+    and can't encode.
+    """
+    serialized = load_resource("raw-browser-response.json")
+    pre_tokenizer = DOMSnapshotPreTokenizer()
+    pre_tokens = pre_tokenizer.pre_tokenize_snapshot(serialized)
+    assert pre_tokens.count("<") == 5
+    assert pre_tokens.count("Hello") == 2
+    assert pre_tokenizer.pre_tokenize_snapshot(
+        json.loads(serialized)) == pre_tokens
+    assert pre_tokenizer.pre_tokenize_snapshot(
+        serialized.encode("utf-8")) == pre_tokens
+    with pytest.raises(RuntimeError):
+        pre_tokenizer.encode_snapshot(serialized)
+
+
+@pytest.mark.parametrize(
+    "resource",
+    ("raw-browser-response", "svg-in-base64", "xhtml-1.0"))
+def test_stream_snapshots(resource):
+    """Test that streamed snapshots pre-tokenize like parsed ones.
+    """
+    serialized = load_resource(f"{resource}.json")
+    expect_tokens = DOMSnapshotPreTokenizer().pre_tokenize_snapshot(
+        serialized)
+    pre_tokenizer = DOMSnapshotPreTokenizer(stream_snapshots=True)
+    assert pre_tokenizer.pre_tokenize_snapshot(serialized) == expect_tokens
+    assert pre_tokenizer.pre_tokenize_snapshot(
+        serialized.encode("utf-8")) == expect_tokens
+
+
+@pytest.mark.parametrize("max_pre_tokens", (0, 1, 50, 4000, 4389))
+def test_max_pre_tokens(max_pre_tokens):
+    """Test that the walk stops when the pre-token budget is spent,
+    and that open elements are still closed.
+    """
+    serialized = load_resource("xhtml-1.0.json")
+    expect_tokens = DOMSnapshotPreTokenizer().pre_tokenize_snapshot(
+        serialized)
+    truncations = []
+    pre_tokenizer = DOMSnapshotPreTokenizer(
+        max_pre_tokens=max_pre_tokens,
+        on_truncated=lambda *args: truncations.append(args))
+    tokens = pre_tokenizer.pre_tokenize_snapshot(serialized)
+    if max_pre_tokens >= len(expect_tokens):
+        assert tokens == expect_tokens
+        assert not truncations
+        return
+
+    [(nodes_walked, nodes_total)] = truncations
+    assert nodes_walked < nodes_total == 96
+    walked = 0
+    while tokens[walked:walked + 1] == expect_tokens[walked:walked + 1]:
+        walked += 1
+    assert walked >= max_pre_tokens
+    closing_tags = tokens[walked:]
+    assert closing_tags[0::3] == ["</"] * (len(closing_tags) // 3)
+    assert closing_tags[2::3] == [">"] * (len(closing_tags) // 3)
+    assert closing_tags[-3:] in ([], ["</", "html", ">"])
+
+
+def test_html_name_tokens():
+    """Test that the prebuilt tag and attribute name pre-tokens match
+    what the splitter makes of the names.
+    """
+    splitter = TextSplitter()
+    tags, attrs = html_name_tokens()
+    assert len(tags) == 2 * len(TAG_NAMES)
+    for name, tag in tags.items():
+        tokens = splitter.split(name, Split.TAG_NAME)
+        assert [token.original for token in tag.start] == ["<"] + tokens
+        if is_void_element(name):
+            assert tag.end == ()
+        else:
+            assert [token.original for token in tag.end] == [
+                "</"] + tokens + [">"]
+    assert tags["SCRIPT"].text_flags == Split.SCRIPT_TEXT
+    assert tags["style"].text_flags == Split.STYLE_TEXT
+    assert tags["p"].text_flags == Split.TEXT
+    assert set(attrs) == ATTRIBUTE_NAMES
+    for name, tokens in attrs.items():
+        assert [token.original for token in tokens] == [
+            "_"] + splitter.split(name, Split.ATTR_NAME) + ["="]
+
+
+def test_unknown_names():
+    """Test that names missing from the prebuilt tables are split,
+    and that the tables aren't used with a non-default splitter.
+    """
+    snapshot = json.dumps({
+        "documents": [{
+            "documentURL": 0,
+            "publicId": -1,
+            "systemId": -1,
+            "nodes": {
+                "parentIndex": [-1, 0, 1, 2],
+                "nodeType": [9, 1, 1, 1],
+                "nodeName": [1, 2, 3, 4],
+                "nodeValue": [-1, -1, -1, -1],
+                "attributes": [[], [5, 6], [], []],
+            },
+        }],
+        "strings": ["about:blank", "#document", "my-widget", "BR", "ABBR",
+                    "data-fooBar", "x"],
+    })
+    expect_tokens = [
+        "<", "my", "widget", "_", "data", "fooBar", "=", "x", ">",
+        "<", "br", ">", "<", "abbr", ">", "</", "abbr", ">",
+        "</", "my", "widget", ">"]
+    buf = TokenBuffer()
+    DOMSnapshotPreTokenizer().pre_tokenize_dom(buf, snapshot)
+    assert [token.original for token in buf.tokens] == expect_tokens
+
+    degraded = []
+    pre_tokenizer = DOMSnapshotPreTokenizer(split_budget=SplitBudget(
+        max_length=3,
+        on_degraded=lambda reason, text: degraded.append(text),
+    ))
+    pre_tokenizer.pre_tokenize_dom(TokenBuffer(), snapshot)
+    assert "ABBR" in degraded
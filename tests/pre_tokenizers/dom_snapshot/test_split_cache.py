@@ -0,0 +1,57 @@
+from dom_tokenizers import DOMSnapshotPreTokenizer
+from dom_tokenizers.pre_tokenizers.token_buffer import TokenBuffer
+
+from ...util import load_resource
+
+
+def tokenize(pre_tokenizer, serialized):
+    buf = TokenBuffer()
+    pre_tokenizer.pre_tokenize_dom(buf, serialized)
+    return [token.original for token in buf.tokens]
+
+
+def test_split_cache_is_shared():
+    """Test that split results are shared between snapshots.
+    """
+    pre_tokenizer = DOMSnapshotPreTokenizer(split_cache_words=False)
+    stats = pre_tokenizer.split_cache.stats
+    snapshot = load_resource("xhtml-1.0.json")
+
+    cold_tokens = tokenize(pre_tokenizer, snapshot)
+    assert stats.hits == 0
+    misses = stats.misses
+    assert misses > 0
+    assert len(pre_tokenizer.split_cache) == misses
+
+    warm_tokens = tokenize(pre_tokenizer, snapshot)
+    assert warm_tokens == cold_tokens
+    assert stats.hits == misses
+    assert stats.misses == misses
+
+
+def test_split_cache_words():
+    """Test that strings cached by word tokenize the same as strings
+    cached whole.
+    """
+    snapshot = load_resource("xhtml-1.0.json")
+    pre_tokenizer = DOMSnapshotPreTokenizer()
+    tokens = tokenize(pre_tokenizer, snapshot)
+    assert pre_tokenizer.split_cache.stats.assembled > 0
+    assert tokens == tokenize(
+        DOMSnapshotPreTokenizer(split_cache_words=False), snapshot)
+
+
+def test_split_cache_limits():
+    """Test that the split cache's limits can be configured.
+    """
+    pre_tokenizer = DOMSnapshotPreTokenizer(
+        split_cache_max_entries=4,
+        split_cache_max_size=1 << 20,
+    )
+    split_cache = pre_tokenizer.split_cache
+    assert split_cache.max_entries == 4
+    assert split_cache.max_size == 1 << 20
+
+    tokenize(pre_tokenizer, load_resource("xhtml-1.0.json"))
+    assert len(split_cache) == 4
+    assert split_cache.stats.evictions > 0
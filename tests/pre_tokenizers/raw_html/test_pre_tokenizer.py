@@ -0,0 +1,128 @@
+import io
+
+import pytest
+
+from dom_tokenizers import DOMSnapshotPreTokenizer, RawHTMLPreTokenizer
+from dom_tokenizers.pre_tokenizers import raw_html
+
+from ...util import load_resource
+
+
+@pytest.mark.parametrize(
+    "resource",
+    ("raw-browser-response", "svg-in-base64"))
+def test_matches_snapshots(resource):
+    """Test that raw HTML pre-tokenizes like snapshots of the DOMs
+    browsers build from it, where no scripts changed them.
+    """
+    expect_tokens = DOMSnapshotPreTokenizer().pre_tokenize_snapshot(
+        load_resource(f"{resource}.json"))
+    tokens = RawHTMLPreTokenizer().pre_tokenize_html(
+        load_resource(f"{resource}.html"))
+    assert tokens == expect_tokens
+
+
+def _snapshot(*nodes):
+    """Return a DOM snapshot of one document, whose nodes are given
+    as (parent index, node type, name, value, attributes) tuples.
+    """
+    strings = ["about:blank", "#document"]
+
+    def index(string):
+        if string is None:
+            return -1
+        if string not in strings:
+            strings.append(string)
+        return strings.index(string)
+
+    nodes = ((-1, 9, "#document", None, ()), *nodes)
+    return {
+        "documents": [{
+            "documentURL": 0,
+            "nodes": {
+                "parentIndex": [node[0] for node in nodes],
+                "nodeType": [node[1] for node in nodes],
+                "nodeName": [index(node[2]) for node in nodes],
+                "nodeValue": [index(node[3]) for node in nodes],
+                "attributes": [
+                    [index(string) for string in node[4]]
+                    for node in nodes],
+            },
+        }],
+        "strings": strings,
+    }
+
+
+@pytest.mark.parametrize(
+    "html,snapshot",
+    (('<svg viewBox="0 0 8 8"><clipPath clipPathUnits="x"/>'
+      '<foreignObject><p viewBox="y"/>z</foreignObject></svg>',
+      _snapshot(
+          (0, 1, "svg", None, ("viewBox", "0 0 8 8")),
+          (1, 1, "clipPath", None, ("clipPathUnits", "x")),
+          (1, 1, "foreignObject", None, ()),
+          (3, 1, "P", None, ("viewbox", "y")),
+          (4, 3, "#text", "z", ()))),
+     ('<math definitionURL="u"><mi/></math><div/>after',
+      _snapshot(
+          (0, 1, "math", None, ("definitionURL", "u")),
+          (1, 1, "mi", None, ()),
+          (0, 1, "DIV", None, ()),
+          (3, 3, "#text", "after", ()))),
+     ),
+    ids=("svg", "math"))
+def test_foreign_elements(html, snapshot):
+    """Test that SVG and MathML elements pre-tokenize like snapshots
+    of them, where their attribute names keep their case, and where
+    self-closing start tags close only them.
+    """
+    expect_tokens = DOMSnapshotPreTokenizer().pre_tokenize_snapshot(snapshot)
+    assert RawHTMLPreTokenizer().pre_tokenize_html(html) == expect_tokens
+
+
+def test_streaming(monkeypatch):
+    """Test that HTML read in chunks, which split tags, text and
+    UTF-8 sequences, pre-tokenizes like HTML passed whole.
+    """
+    html = load_resource("xhtml-1.0.html")
+    assert "©" in html
+    pre_tokenizer = RawHTMLPreTokenizer()
+    expect_tokens = pre_tokenizer.pre_tokenize_html(html)
+    assert "Copyright" in expect_tokens
+    assert pre_tokenizer.pre_tokenize_html(
+        html.encode("utf-8")) == expect_tokens
+
+    monkeypatch.setattr(raw_html, "READ_SIZE", 7)
+    assert pre_tokenizer.pre_tokenize_html(
+        io.StringIO(html)) == expect_tokens
+    assert pre_tokenizer.pre_tokenize_html(
+        io.BytesIO(html.encode("utf-8"))) == expect_tokens
+
+
+@pytest.mark.parametrize(
+    "html,expect_tokens",
+    (("<ul><li>one<li>two</ul></p><br/><div/>x",
+      ["<", "ul", ">", "<", "li", ">", "one", "</", "li", ">",
+       "<", "li", ">", "two", "</", "li", ">", "</", "ul", ">",
+       "<", "br", ">", "<", "div", ">", "x", "</", "div", ">"]),
+     ("<table><tr><td>1<td>2<tr><th>3</table><p>a<div>b",
+      ["<", "table", ">", "<", "tr", ">", "<", "td", ">", "1",
+       "</", "td", ">", "<", "td", ">", "2", "</", "td", ">",
+       "</", "tr", ">", "<", "tr", ">", "<", "th", ">", "3",
+       "</", "th", ">", "</", "tr", ">", "</", "table", ">",
+       "<", "p", ">", "a", "</", "p", ">", "<", "div", ">", "b",
+       "</", "div", ">"]),
+     ("<P HIDDEN Class=a&amp;b>x<!-- note --></p>",
+      ["<", "p", "_", "hidden", "=", "_", "class", "=", "a", "b", ">",
+       "x", "<!--", "note", "-->", "</", "p", ">"]),
+     ('<!DOCTYPE html SYSTEM "about:legacy-compat"><?php echo 1 ?>',
+      ["<!DOCTYPE", "html", "about", "legacy", "compat", ">",
+       "<!--", "php", "echo", "1", "-->"]),
+     ("<script>if (a < b) x = /re/g;</script><style>p{color:red}</style>",
+      ["<", "script", ">", "if", "a", "b", "x", "re", "g",
+       "</", "script", ">", "<", "style", ">", "p", "color", "red",
+       "</", "style", ">"]),
+     ),
+    ids=("implied-end", "table", "attributes", "declarations", "code"))
+def test_markup(html, expect_tokens):
+    assert RawHTMLPreTokenizer().pre_tokenize_html(html) == expect_tokens
@@ -0,0 +1,48 @@
+import pytest
+
+from dom_tokenizers.pre_tokenizers.base64 import (
+    base64_probabilities,
+    base64_probability,
+    base64_skew,
+    symbol_coincidences,
+)
+
+TEXTS = [
+    "",
+    "hello",
+    "Hello",
+    "héllo",
+    "hello world",
+    "L0gH7uiS0HpxahWElsqTPIQS2YzobL",
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk",
+    "aGVsbG8gd29ybGQ=",
+    "0123456789",
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    "abc+def/ghi",
+    "x" * 1000,
+]
+
+
+@pytest.mark.parametrize("count", range(len(TEXTS) + 1))
+def test_batch_skew(count):
+    """Batch skews match those calculated one text at a time."""
+    texts = TEXTS[:count]
+    assert base64_skew.batch(texts) == list(map(base64_skew, texts))
+
+
+def test_batch_probability():
+    """Batch probabilities match those calculated one at a time."""
+    assert base64_probabilities(TEXTS) == list(
+        map(base64_probability, TEXTS))
+
+
+@pytest.mark.parametrize(
+    "text,expect_phi",
+    (("", 0),
+     ("abc", 0),
+     ("aab", 2),
+     ("aaab", 6),
+     ("abab", 4),
+     ))
+def test_symbol_coincidences(text, expect_phi):
+    assert symbol_coincidences(text) == expect_phi
@@ -0,0 +1,57 @@
+import pytest
+
+from dom_tokenizers.pre_tokenizers import branch_stats
+from dom_tokenizers.pre_tokenizers.branch_stats import (
+    disable_branch_stats,
+    enable_branch_stats,
+)
+from dom_tokenizers.pre_tokenizers.splitter import TextSplitter
+
+
+@pytest.fixture
+def stats():
+    disable_branch_stats()
+    try:
+        yield enable_branch_stats()
+    finally:
+        disable_branch_stats()
+
+
+def test_branch_counts(stats):
+    """Ensure the branches the splitter takes are counted.
+    """
+    splitter = TextSplitter()
+    splitter.split("hello%20world, it's a caf&eacute;_bar 0x1234")
+    assert not stats.seconds
+    counts = dict(stats.counts)
+    assert counts["it's urlencoded"] == 1
+    assert counts["it's an entity"] == 1
+    assert counts["prefixed hex"] == 1
+    assert counts["it's stuff with underscores"] == 1
+
+    splitter.split("hello_world%20x")  # not predecoded
+    assert stats.counts["it's urlencoded"] == 2
+    stats.clear()
+    assert not stats.counts
+
+
+def test_branch_timing(stats):
+    """Ensure the time the splitter spends is added to the branches
+    it takes, if requested.
+    """
+    assert enable_branch_stats(timing=True) is stats
+    TextSplitter().split("aGVsbG8gd29ybGQgaGVsbG8gd29ybGQ= x_y " * 100)
+    assert set(stats.seconds) == set(stats.counts)
+    assert all(seconds > 0 for seconds in stats.seconds.values())
+    summary = stats.summary()
+    assert [branch for branch, _, _ in summary] == [
+        branch for branch, _ in stats.counts.most_common()]
+    assert summary[0][1] == max(stats.counts.values())
+
+
+def test_disabled():
+    """Ensure nothing is gathered when branch statistics are disabled.
+    """
+    assert disable_branch_stats() is None
+    TextSplitter().split("hello%20world")
+    assert branch_stats.active is None
@@ -0,0 +1,120 @@
+import io
+
+import pytest
+
+from dom_tokenizers.internal import json
+
+
+@pytest.fixture
+def backend():
+    """Restore the selected backend after the test."""
+    original_backend = json.get_backend()
+    try:
+        yield original_backend
+    finally:
+        json.set_backend(original_backend)
+
+
+@pytest.mark.parametrize("name", json.available_backends())
+@pytest.mark.parametrize(
+    "serialized,expect_result",
+    (('{"a": [1, 2.5, null, true]}', {"a": [1, 2.5, None, True]}),
+     (b'"caf\xc3\xa9"', "café"),
+     ('"\\ud800"', "\ud800"),
+     ("[NaN]", [float("nan")]),
+     ))
+def test_loads(backend, name, serialized, expect_result):
+    """Ensure every backend parses whatever the standard library does.
+    """
+    assert json.set_backend(name) == name
+    assert json.get_backend() == name
+    result = json.loads(serialized)
+    assert repr(result) == repr(expect_result)
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(serialized[:-1])
+
+
+def test_dumps():
+    """Ensure serialization is compact unless asked otherwise.
+    """
+    assert json.dumps({"a": [1, 2]}) == '{"a":[1,2]}'
+    assert json.dumps([1, 2], separators=(", ", ": ")) == "[1, 2]"
+    fp = io.StringIO()
+    json.dump({"a": [1, 2]}, fp)
+    assert fp.getvalue() == '{"a":[1,2]}'
+
+
+def test_load(backend):
+    assert json.load(io.StringIO('{"a": 1}')) == {"a": 1}
+
+
+def test_loads_kwargs(backend):
+    """Ensure keyword arguments are honoured by every backend.
+    """
+    for name in json.available_backends():
+        json.set_backend(name)
+        assert json.loads("[1.5]", parse_float=str) == ["1.5"]
+
+
+def test_set_backend_from_environment(backend, monkeypatch):
+    monkeypatch.setenv(json.BACKEND_ENV_VAR, "json")
+    assert json.set_backend() == "json"
+    monkeypatch.setenv(json.BACKEND_ENV_VAR, "")
+    assert json.set_backend() == json.available_backends()[0]
+
+
+def test_unknown_backend(backend, monkeypatch):
+    monkeypatch.setattr(json, "BACKENDS", json.BACKENDS + ("not_installed",))
+    with pytest.raises(ValueError):
+        json.set_backend("xml")
+    with pytest.raises(ValueError):
+        json.set_backend("not_installed")
+    assert json.get_backend() == backend
+
+
+_SELECTED_FIELDS = {
+    "a": True,
+    "b": {"c": True},
+    "d": [{"e": True}],
+}
+_SELECTED_FIELDS["f"] = _SELECTED_FIELDS
+
+
+@pytest.mark.parametrize(
+    "serialized,expect_result",
+    (('{"a": {"x": [1]}, "b": {"c": "}", "x": "]"}, "x": [{"a": 1}]}',
+      {"a": {"x": [1]}, "b": {"c": "}"}}),
+     ('{"d": [{"e": 1, "x": [[1, 2], [3, {"y": "\\""}]]}, {}], "x": 1}',
+      {"d": [{"e": 1}, {}]}),
+     ('{"f": {"f": {"a": null, "x": {}}, "x": 1.5e3}}',
+      {"f": {"f": {"a": None}}}),
+     ('{"b": [1], "d": {"e": 2}}', {"b": [1], "d": {"e": 2}}),
+     (' {\n "x" : "\\ud800" , "a" : "\\ud800" }\n', {"a": "\ud800"}),
+     ),
+    ids=("object", "array", "recursive", "unexpected-types", "whitespace"))
+def test_loads_selected(backend, serialized, expect_result):
+    """Ensure only what's selected is kept.
+    """
+    for name in json.available_backends():
+        json.set_backend(name)
+        assert json.loads_selected(
+            serialized, _SELECTED_FIELDS) == expect_result
+        assert json.loads_selected(
+            serialized.encode("utf-8"), _SELECTED_FIELDS) == expect_result
+
+
+@pytest.mark.parametrize(
+    "serialized",
+    ('[{"a": 1}]',
+     '{"a": 1',
+     '{"a": 1,}',
+     '{"a": 1} {}',
+     '{"x": [1, 2}',
+     '{"x": "unterminated}',
+     '{"x": }',
+     '{"x" 1}',
+     "{x: 1}",
+     ))
+def test_loads_selected_errors(serialized):
+    with pytest.raises(json.JSONDecodeError):
+        json.loads_selected(serialized, _SELECTED_FIELDS)
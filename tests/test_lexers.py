@@ -0,0 +1,39 @@
+import pytest
+
+from dom_tokenizers.pre_tokenizers.lexers import CSS_LEXEME_RE, JS_LEXEME_RE
+
+
+@pytest.mark.parametrize(
+    "text,expect_lexemes",
+    (("var x = 'it\\'s'; // done",
+      [("word", "var"), ("word", "x"), ("sq_string", "it\\'s"),
+       ("comment", " done")]),
+     ("a = b / c / d",
+      [("word", "a"), ("word", "b"), ("word", "c"), ("word", "d")]),
+     ("A=/[^\\w`]/g,B=`x`",
+      [("word", "A"), ("regex", "[^\\w`]"), ("word", "g"),
+       ("word", "B"), ("template", "x")]),
+     ("return /a\\/b/.test(0xff_id)",
+      [("word", "return"), ("regex", "a\\/b"), ("word", "test"),
+       ("other", "0xff"), ("word", "id")]),
+     ('s = "unterminated\nx',
+      [("word", "s"), ("string", "unterminated"), ("word", "x")]),
+     ("/* never closed", [("block_comment", " never closed")]),
+     ),
+    ids=("literals", "division", "regex", "return-regex", "unterminated",
+         "unterminated-comment"))
+def test_js_lexemes(text, expect_lexemes):
+    assert [
+        (match.lastgroup, match.group(match.lastgroup))
+        for match in JS_LEXEME_RE.finditer(text)
+    ] == expect_lexemes
+
+
+def test_css_lexemes():
+    text = "a:hover{background:URL( a.png )} b{c:url('d.png')} /* e */"
+    assert [
+        (match.lastgroup, match.group(match.lastgroup))
+        for match in CSS_LEXEME_RE.finditer(text)
+    ] == [("word", "a"), ("word", "hover"), ("word", "background"),
+          ("url", "a.png"), ("word", "b"), ("word", "c"), ("word", "url"),
+          ("sq_string", "d.png"), ("comment", " e ")]
@@ -0,0 +1,53 @@
+import zlib
+
+from io import BytesIO
+from random import Random
+
+import pytest
+
+from PIL import Image
+
+from dom_tokenizers.pre_tokenizers import sniffer
+from dom_tokenizers.pre_tokenizers.sniffer import sniff_binary
+
+_RANDOM_BYTES = Random(23).randbytes(256)
+
+
+def _image(format):
+    buf = BytesIO()
+    Image.new("RGB", (5, 5)).save(buf, format)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize(
+    "data,expect_format",
+    ((_image("GIF"), "GIF"),
+     (_image("JPEG"), "JPEG"),
+     (_image("WEBP"), "webp"),
+     (b"wOFF" + _RANDOM_BYTES, "woff"),
+     (b"wOF2" + _RANDOM_BYTES, "woff"),
+     (zlib.compress(_RANDOM_BYTES), "zlib"),
+     (zlib.compress(_RANDOM_BYTES, 1), "zlib"),
+     (zlib.compress(b"hello" * 50, 9), "zlib"),
+     (_image("PNG"), None),
+     (b"RIFF" + _RANDOM_BYTES, None),
+     (_RANDOM_BYTES, None),
+     ),
+    ids=("gif", "jpeg", "webp", "woff", "woff2", "zlib", "zlib-1",
+         "zlib-9", "png", "riff", "random"))
+@pytest.mark.parametrize("with_libmagic", (True, False))
+def test_sniff_binary(data, expect_format, with_libmagic, monkeypatch):
+    """Everything the splitter reports is found with or without
+    libmagic.
+    """
+    if not with_libmagic:
+        monkeypatch.setattr(sniffer, "magic", None)
+    sniffer._sniff_with_libmagic.cache_clear()
+    assert sniff_binary(data) == expect_format
+
+
+def test_not_zlib():
+    """Random data with a zlib header isn't taken as zlib without
+    asking libmagic (which will say it is).
+    """
+    assert not sniffer._is_zlib(b"x\x9c" + _RANDOM_BYTES)
@@ -0,0 +1,116 @@
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+
+import pytest
+
+from dom_tokenizers.pre_tokenizers.split_cache import SplitCache
+from dom_tokenizers.pre_tokenizers.splitter import TextSplitter, Flags
+
+
+@pytest.fixture
+def splitter():
+    return TextSplitter()
+
+
+def test_hits_and_misses(splitter):
+    cache = SplitCache(splitter)
+    assert cache.split("hello world") == ("hello", "world")
+    assert cache.split("hello world") == ("hello", "world")
+    assert cache.split("hello world", Flags.TAG_NAME) == ("hello", "world")
+    assert cache.split("Hello world", Flags.TAG_NAME) == ("hello", "world")
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 3
+    assert cache.stats.evictions == 0
+    assert cache.stats.hit_rate == 0.25
+    assert len(cache) == 3
+
+
+def test_lru_eviction(splitter):
+    cache = SplitCache(splitter, max_entries=2)
+    cache.split("a")
+    cache.split("b")
+    cache.split("a")  # "b" is now least recently used
+    cache.split("c")
+    assert len(cache) == 2
+    assert cache.stats.evictions == 1
+    cache.split("a")
+    assert cache.stats.hits == 2
+    cache.split("b")
+    assert cache.stats.misses == 4
+
+
+def test_size_limit(splitter):
+    cache = SplitCache(splitter)
+    cache.split("hello world")
+    size = cache.stats.size
+    assert size > 0
+
+    cache = SplitCache(splitter, max_size=size)
+    cache.split("hello world")
+    cache.split("hello there")
+    assert len(cache) == 1
+    assert cache.stats.evictions == 1
+    assert cache.stats.size <= size
+
+
+def test_oversized_results_not_cached(splitter):
+    cache = SplitCache(splitter, max_size=16)
+    assert cache.split("hello world") == ("hello", "world")
+    assert len(cache) == 0
+    assert cache.stats.evictions == 0
+
+
+def test_clear(splitter):
+    cache = SplitCache(splitter)
+    cache.split("hello world")
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats.size == 0
+    assert cache.stats.misses == 1
+
+
+def test_cache_words(splitter):
+    cache = SplitCache(splitter, cache_words=True)
+    assert cache.split("btn btn-primary col-md-6") == (
+        "btn", "btn", "primary", "col", "md", "6")
+    assert cache.split("btn-primary d-flex") == (
+        "btn", "primary", "d", "flex")
+    assert cache.stats.assembled == 2
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 4
+    assert len(cache) == 4
+
+    cache.split("hello world")  # quicker split whole
+    assert cache.stats.assembled == 2
+    assert len(cache) == 5
+
+
+def test_threads(splitter):
+    """Ensure threads sharing a cache get the right results, and
+    leave its entries and counters consistent.
+    """
+    cache = SplitCache(splitter, max_entries=8)
+    texts = [f"word{i} hello-world" for i in range(32)]
+    expect = {text: tuple(splitter.split(text)) for text in texts}
+    lookups = 200
+
+    def worker(seed):
+        random = Random(seed)
+        for _ in range(lookups):
+            text = random.choice(texts)
+            assert cache.split(text) == expect[text]
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(worker, range(8)))
+    finally:
+        sys.setswitchinterval(interval)
+
+    stats = cache.stats
+    assert stats.hits + stats.misses == 8 * lookups
+    assert stats.entries == len(cache) <= 8
+    assert stats.size == sum(size for _, size in cache._entries.values())
@@ -1,6 +1,20 @@
+import base64
+import time
+import tracemalloc
+
+from itertools import cycle
+from random import Random
+
 import pytest
 
-from dom_tokenizers.pre_tokenizers.splitter import TextSplitter, SPLIT
+from dom_tokenizers.pre_tokenizers.splitter import (
+    SPLIT,
+    Flags,
+    SplitBudget,
+    TextSplitter,
+)
+
+from .util import load_resource, json
 
 
 @pytest.mark.parametrize(
@@ -54,6 +68,26 @@ def test_first_split_re(text, expect_splits):
     assert TextSplitter.FIRST_SPLIT_RE.split(text) == expect_splits
 
 
+@pytest.mark.parametrize(
+    "text,expect_length",
+    (("", 0),
+     ("hello", 5),
+     ("hello world", 5),
+     ("aGVsbG8+d29ybGQ/Cg==", 20),
+     ("aGVsbG8+d29ybGQ/Cg===", 20),
+     ("aGVsbG8=d29ybGQ", 8),
+     ("caf\u00e9", 3),
+     ("-_.", 0),
+     ("ab!" + "x" * 100000, 2),
+     ))
+def test_base64_prefix_re(text, expect_length):
+    """Check that `TextSplitter.BASE64_PREFIX_RE` matches the base64
+    alphabet characters text starts with, and up to two of padding.
+    """
+    match = TextSplitter.BASE64_PREFIX_RE.match(text)
+    assert match.end() == expect_length
+
+
 @pytest.mark.parametrize(
     "text,expect_tokens",
     (("hello world", ["hello", "world"]),
@@ -271,8 +305,583 @@ def test_nonascii_in_base64(text, expect_tokens):
        "range", "U", "0000", "00FF"]),
      (r"kNEu9lE8g2RGVVvZ6clo\\u003d\x22,1,0,null",
       ["[BASE64]", "1", "0", "null"]),
+     ("t\u2019\u672c/m", ["t'Ben ", "m"]),
+     ("t\u2019\u672c\u672c hello", ["t'Ben Ben ", "hello"]),
+     ("1\u2019\u5b57#9", ["1'Zi ", "9"]),
+     ("x=aGVsbG8gd29ybGQgaGVsbG8gd29ybGQ=", ["x", "[BASE64]", "utf", "8"]),
      ))
 def test_regressions(text, expect_tokens):
     """Check that things we improve stay improved.
     """
     assert list(TextSplitter().split(text)) == expect_tokens
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        TextSplitter(engine="potato")
+
+
+@pytest.mark.parametrize(
+    "resource",
+    ("raw-browser-response",
+     "svg-in-base64",
+     "xhtml-1.0",
+     ))
+@pytest.mark.parametrize(
+    "flags",
+    (Flags.FULL,
+     Flags.BASIC,
+     Flags.TAG_NAME,
+     ))
+def test_linear_engine(resource, flags, monkeypatch):
+    """Ensure the linear engine splits exactly like the reference engine.
+    """
+    monkeypatch.setattr(TextSplitter, "INPUT_BLOCK", 1)
+    monkeypatch.setattr(TextSplitter, "SPLIT_WINDOW", 8)
+    monkeypatch.setattr(TextSplitter, "RETIRE_THRESHOLD", 8)
+    snapshot = json.loads(load_resource(f"{resource}.json"))
+    strings = snapshot.get("result", snapshot)["strings"]
+    strings.append(" ".join(strings))
+    escapes = ("", "%20", r"\u0041", "&amp;", "_x", "it's", "0xdeadbeef",
+               "_", "t\u2019s", "\u672c", "%C3%A9", "&#x41;", "\\\\")
+    strings.append(",".join(
+        f"{word}{escape}"
+        for word, escape in zip(strings, cycle(escapes))))
+    reference = TextSplitter(engine="reference")
+    linear = TextSplitter(engine="linear")
+    for text in strings:
+        assert list(linear.split(text, flags)) == \
+            list(reference.split(text, flags))
+
+
+@pytest.mark.parametrize(
+    "text",
+    ("?f n'_",
+     ".d t'_",
+     ":o s'%C3%Ba",
+     ")o t\\x",
+     "]2 C\\a",
+     "t\u2019\u672c/m",
+     ))
+@pytest.mark.parametrize(
+    "flags",
+    (Flags.FULL,
+     Flags.BASIC,
+     ))
+def test_linear_engine_lookahead(text, flags, monkeypatch):
+    """Ensure the linear engine reads far enough ahead to split like
+    the reference engine where the splitting of one piece depends on
+    characters well beyond it.
+    """
+    monkeypatch.setattr(TextSplitter, "INPUT_BLOCK", 1)
+    reference = TextSplitter(engine="reference")
+    linear = TextSplitter(engine="linear")
+    assert list(linear.split(text, flags)) == \
+        list(reference.split(text, flags))
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    ("a_b c_d e_f ",
+     "it's don't ",
+     "h\u00e9llo w\u00f6rld \u5317\u4eac, x_y ",
+     r"var a=b.c(d);if(x){y_z()}\u0041 ",
+     "hello world, foo.bar ",
+     ))
+def test_linear_engine_scaling(pattern):
+    """Ensure splitting with the linear engine takes linear time.
+    """
+    splitter = TextSplitter(engine="linear")
+
+    def elapsed(count):
+        text = pattern * count
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            for _ in splitter.split(text):
+                pass
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    # Eight times the input should take around eight times as long,
+    # not the sixty-four times it would if splitting were quadratic.
+    assert elapsed(16000) < 20 * elapsed(2000)
+
+
+@pytest.mark.parametrize(
+    "text,expect_fast",
+    (("", True),
+     ("hello", True),
+     ("  hello \t world\n", True),
+     ("deadbeefcafe", True),
+     ("ABCDEFGHIJKLMNOPQRSTUVW", True),
+     ("ABCDEFGHIJKLMNOPQRSTUVWX", False),  # long enough to sniff
+     ("0x1234", False),  # prefixed hex
+     ("hello 0X1234", False),
+     ("hello x0x1234", True),
+     ("hello, world", False),
+     ("hello_world", False),
+     ("héllo, world", False),
+     ))
+@pytest.mark.parametrize("input_block", (1, 256))
+def test_fast_path(text, expect_fast, input_block, monkeypatch):
+    """Ensure the simple-text fast path fires when it should, and
+    that it splits the same as the reference engine when it does.
+    """
+    monkeypatch.setattr(TextSplitter, "INPUT_BLOCK", input_block)
+    splitter = TextSplitter()
+    tokens = list(splitter.split(text))
+    assert splitter.fast_path_hits == int(expect_fast)
+    assert tokens == list(TextSplitter(engine="reference").split(text))
+
+
+@pytest.mark.parametrize(
+    "text,expect_fast",
+    (("héllo world", True),
+     ("Москва — столица России", False),
+     ("Москва столица России", True),
+     ("  北京是中华人民共和国的首都\n", True),
+     ("القاهرة هي عاصمة مصر", False),  # transliterates to punctuation
+     ("объём подъезд", False),  # transliterates to apostrophes
+     ("東京 ABCDEFGHIJKLMNOPQRSTUVWX", False),
+     ("नमस्ते", False),  # has combining marks
+     ("hello_wörld", False),
+     ))
+def test_transliterated_fast_path(text, expect_fast):
+    """Ensure text made of non-ASCII words splits exactly like the
+    reference engine, taking the fast path if its words transliterate
+    to simple text.
+    """
+    splitter = TextSplitter()
+    tokens = list(splitter.split(text))
+    assert splitter.fast_path_hits == int(expect_fast)
+    assert tokens == list(TextSplitter(engine="reference").split(text))
+
+
+@pytest.mark.parametrize(
+    "text,expect_decoded",
+    (("hello%20world%2C%20how%20are%20you%3F", "hello world, how are you?"),
+     ("Tom &amp; Jerry &#8211; &quot;cats&quot;", "Tom   Jerry –  cats "),
+     (r"\u003cdiv\u003e \x41\x42", "<div> AB"),
+     ("caf%C3%A9 &#x41;BC", "café ABC"),
+     ("plain text", None),
+     ("a_b%20c", None),  # underscores split first
+     ("hello\\x", None),  # terminal backslash
+     ("0x12%E5%8C%97", None),  # merges into prefixed hex
+     ("hello\n%20world", None),
+     ("&#92;x41", None),  # decodes to another escape
+     (r"hello\'\x77orld", None),  # merges into an apostrophe word
+     (r"a=\u0022", None),  # merges into possible base64
+     ("abcdefghijklmnopqrstuvwxyz%41", None),  # merges into long word
+     ))
+def test_predecode(text, expect_decoded):
+    """Ensure text is decoded in one scan only where that splits
+    exactly as decoding piece by piece does.
+    """
+    splitter = TextSplitter()
+    assert splitter._decode_escapes(text, Flags.FULL) == expect_decoded
+    tokens = splitter.split(text)
+    assert tokens == TextSplitter(predecode=False).split(text)
+    assert tokens == TextSplitter(engine="reference").split(text)
+
+
+@pytest.mark.parametrize(
+    "text,flags,expect_tokens",
+    (("https://example.com/static/css/main.css", Flags.URL_ATTR_VALUE,
+      ["https", "example", "com", "static", "css", "main", "css"]),
+     ("/wp-content/uploads/2023/AbCdEfGhIjKlMnOpQrStUvWx.jpg",
+      Flags.URL_ATTR_VALUE,
+      ["wp", "content", "uploads", "2023", "AbCdEfGhIjKlMnOpQrStUvWx", "jpg"]),
+     ("/wp-content/uploads/2023/AbCdEfGhIjKlMnOpQrStUvWx.jpg",
+      Flags.ATTR_VALUE,
+      ["wp", "[BASE64]", "jpg"]),
+     ("/a?token=SGVsbG8gV29ybGQhIFRoaXMgaXMgYmFzZTY0&x=y#frag",
+      Flags.URL_ATTR_VALUE,
+      ["a", "token", "[BASE64]", "utf", "8", "x", "y", "frag"]),
+     ("a.jpg 1x, images/b.jpg 2x,c.png 3x", Flags.URL_ATTR_VALUE,
+      ["a", "jpg", "1x", "images", "b", "jpg", "2x", "c", "png", "3x"]),
+     ("https://user:pw@[::1]:8080/caf%C3%A9", Flags.URL_ATTR_VALUE,
+      ["https", "user", "pw", "1", "8080", "cafe"]),
+     ("http://[::1/x", Flags.URL_ATTR_VALUE, ["http", "1", "x"]),
+     ("data:text/plain;base64,SGVsbG8gV29ybGQhIFRoaXMgaXMgYmFzZTY0",
+      Flags.URL_ATTR_VALUE,
+      ["data", "text", "plain", "base64", "[BASE64]", "utf", "8"]),
+     ("javascript:void(0)", Flags.URL_ATTR_VALUE,
+      ["javascript", "void", "0"]),
+     ("color: red; background: URL( '/i/AbCdEfGhIjKlMnOpQrStUvWx.png' )",
+      Flags.STYLE_ATTR_VALUE,
+      ["color", "red", "background", "URL", "i", "AbCdEfGhIjKlMnOpQrStUvWx",
+       "png"]),
+     ("display: none", Flags.STYLE_ATTR_VALUE, ["display", "none"]),
+     ))
+def test_split_urls(text, flags, expect_tokens):
+    """Ensure URLs are split structurally, and sniffed for base64 only
+    where it's expected.
+    """
+    assert list(TextSplitter().split(text, flags)) == expect_tokens
+
+
+_RANDOM_BYTES = Random(23).randbytes(6000)
+
+
+@pytest.mark.parametrize(
+    "data,expect_tokens",
+    ((b'<svg xmlns="http://www.w3.org/2000/svg">' + b"<g/>" * 1000
+      + b"</svg>", ["[BASE64]", "svg"]),
+     (b'{"hello": "' + "wörld ".encode() * 1000 + b'"}',
+      ["[BASE64]", "json"]),
+     (b'["hello", "' + "wörld ".encode() * 1000 + b'"] x',
+      ["[BASE64]", "utf", "8"]),
+     ("héllo wörld ".encode() * 1000, ["[BASE64]", "utf", "8"]),
+     (b"GIF89a" + _RANDOM_BYTES, ["[BASE64]", "GIF"]),
+     ("héllo wörld ".encode() * 1000 + b"\xff", ["[BASE64]"]),
+     (_RANDOM_BYTES, ["[BASE64]"]),
+     ),
+    ids=("svg", "json", "not-json", "utf-8", "gif", "not-utf-8", "random"))
+@pytest.mark.parametrize("sniff_limit", (64, 65, 66, 67, 1 << 16))
+def test_giant_base64(data, expect_tokens, sniff_limit):
+    """Giant blobs of base64 are classified from a prefix and a
+    sample of their end the same as if they'd been decoded fully.
+    """
+    text = base64.b64encode(data).decode()
+    splitter = TextSplitter(base64_sniff_limit=sniff_limit)
+    assert list(splitter.split(text)) == expect_tokens
+
+
+def test_bad_base64_sniff_limit():
+    with pytest.raises(ValueError):
+        TextSplitter(base64_sniff_limit=4)
+
+
+def _data_uri(media_type, data):
+    return f"data:{media_type};base64,{base64.b64encode(data).decode()}"
+
+
+_SVG = b'<svg xmlns="http://www.w3.org/2000/svg">' + b"<g/>" * 100 + b"</svg>"
+
+
+@pytest.mark.parametrize(
+    "text,expect_tokens",
+    ((_data_uri("image/svg+xml", _SVG),
+      ["data", "image", "svg", "xml", "base64", "[BASE64]", "svg"]),
+     (_data_uri("image/svg+xml", b'<?xml version="1.0"?>\n' + _SVG),
+      ["data", "image", "svg", "xml", "base64", "[BASE64]", "svg"]),
+     (_data_uri("image/gif", b"GIF89a" + _RANDOM_BYTES),
+      ["data", "image", "gif", "base64", "[BASE64]", "GIF"]),
+     (_data_uri("font/woff2", b"wOF2" + _RANDOM_BYTES),
+      ["data", "font", "woff2", "base64", "[BASE64]", "woff"]),
+     (_data_uri("application/json", json.dumps({"hello": ["world"] * 20})
+                .encode()),
+      ["data", "application", "json", "base64", "[BASE64]", "json"]),
+     (_data_uri("text/plain;charset=utf-8", "héllo wörld ".encode() * 20),
+      ["data", "text", "plain", "charset", "utf", "8", "base64",
+       "[BASE64]", "utf", "8"]),
+     (f"url({_data_uri('IMAGE/GIF', b'GIF89a' + _RANDOM_BYTES)}) no-repeat",
+      ["url", "data", "IMAGE", "GIF", "base64", "[BASE64]", "GIF",
+       "no", "repeat"]),
+     (_data_uri("image/png", b"GIF89a" + _RANDOM_BYTES),
+      ["data", "image", "png", "base64", "[BASE64]", "GIF"]),
+     (_data_uri("image/x-icon", b"GIF89a" + _RANDOM_BYTES),
+      ["data", "image", "x", "icon", "base64", "[BASE64]", "GIF"]),
+     ),
+    ids=("svg", "svg-xml", "gif", "woff2", "json", "text", "css",
+         "mismatched", "untrusted"))
+def test_data_uris(text, expect_tokens):
+    """Base64 data URIs are split using their media types if trusted,
+    and by sniffing their payloads if not.
+    """
+    assert list(TextSplitter().split(text)) == expect_tokens
+
+
+@pytest.mark.parametrize(
+    "media_type,data",
+    (("image/svg+xml", _SVG),
+     ("image/gif", b"GIF89a" + _RANDOM_BYTES),
+     ("font/woff2", b"wOF2" + _RANDOM_BYTES)))
+def test_trusted_data_uris_not_sniffed(media_type, data, monkeypatch):
+    """Ensure base64 data URIs with trusted media types are split
+    without decoding their payloads.
+    """
+    def enter_base64(*args, **kwargs):
+        raise AssertionError("payload sniffed")
+
+    monkeypatch.setattr(TextSplitter, "_enter_base64", enter_base64)
+    tokens = list(TextSplitter().split(_data_uri(media_type, data)))
+    assert "[BASE64]" in tokens
+
+
+_HELLO_BASE64 = base64.b64encode(b"hello world " * 3).decode()
+
+
+@pytest.mark.parametrize(
+    "text,flags,expect_words",
+    (("btn btn-primary col-md-6", Flags.FULL,
+      ["btn", "btn-primary", "col-md-6"]),
+     ("hover:bg-blue-500 w-1/2\n", Flags.FULL,
+      ["hover:bg-blue-500", "w-1/2"]),
+     ("it's a-b", Flags.FULL, ["it's", "a-b"]),
+     ("hello world", Flags.FULL, None),
+     ("a-b md:w-[calc(100%-2rem)]", Flags.FULL, None),
+     ("a-b md:w-[calc(100%-2rem)]", Flags.BASIC,
+      ["a-b", "md:w-[calc(100%-2rem)]"]),
+     ("a-b \\u0041", Flags.FULL, None),
+     ("a-b &amp;", Flags.FULL, None),
+     (f"a-b {_HELLO_BASE64}", Flags.FULL, None),
+     (f"a-b {_HELLO_BASE64}", Flags.TAG_NAME, ["a-b", _HELLO_BASE64]),
+     ("a-b caf\u00e9", Flags.FULL, None),
+     ("it's a_b", Flags.FULL, None),
+     ("a-b c-d", Flags.URL_ATTR_VALUE, None),
+     ("a-b c-d", Flags.STYLE_ATTR_VALUE, None),
+     ),
+    ids=("class", "tailwind", "apostrophe", "simple", "escape",
+         "escape-basic", "js", "entity", "base64", "base64-unsniffed",
+         "non-ascii", "apostrophe-underscore", "url", "style"))
+def test_whitespace_words(text, flags, expect_words):
+    """Ensure text is split a word at a time only where that gives
+    the same tokens.
+    """
+    splitter = TextSplitter()
+    words = splitter.whitespace_words(text, flags)
+    assert words == expect_words
+    if words is not None:
+        assert splitter.split(text, flags) == [
+            token for word in words for token in splitter.split(word, flags)]
+
+
+def test_whitespace_words_budget():
+    """Ensure text is split whole if it has a budget.
+    """
+    splitter = TextSplitter(budget=SplitBudget(max_length=4))
+    assert splitter.whitespace_words("a-b c-d", Flags.FULL) is None
+
+
+@pytest.mark.parametrize(
+    "text,flags,expect_tokens",
+    (('var fooBar = "hello\\u0020world"; // it\'s a comment',
+      Flags.SCRIPT_TEXT,
+      ["var", "fooBar", "hello", "world", "it's", "a", "comment"]),
+     ("x = a / b / c; y = /[`]/g.test(`tmpl ${z}`)", Flags.SCRIPT_TEXT,
+      ["x", "a", "b", "c", "y", "g", "test", "tmpl", "z"]),
+     (f'var img = "data:image/png;base64,{_HELLO_BASE64}";', Flags.SCRIPT_TEXT,
+      ["var", "img", "data", "image", "png", "base64", "[BASE64]",
+       "utf", "8"]),
+     (".btn-primary { color: #FF0000; background: url(/img/a_b.png) }",
+      Flags.STYLE_TEXT,
+      ["btn", "primary", "color", "FF0000", "background", "url",
+       "img", "a", "b", "png"]),
+     ('a::after { content: "\\201C" } /* hi */', Flags.STYLE_TEXT,
+      ["a", "after", "content", "201C", "hi"]),
+     ),
+    ids=("js", "js-regex", "js-base64", "css", "css-escape"))
+def test_lexed_code(text, flags, expect_tokens):
+    """Ensure script and style text is split like any other text when
+    lexed as code.
+    """
+    splitter = TextSplitter()
+    assert splitter.split(text, flags) == expect_tokens
+    assert splitter.split(text, Flags.TEXT) == expect_tokens
+
+
+@pytest.mark.parametrize(
+    "text,flags,expect_spans",
+    (("hello world", Flags.FULL,
+      [(None, "hello"), (None, "world")]),
+     ("Hello World", Flags.TAG_NAME,
+      [("hello", "Hello"), ("world", "World")]),
+     ("hello%20world it's", Flags.FULL,
+      [(None, "hello"), (None, "world"), (None, "it's")]),
+     ("caf\u00e9 na\u00efve", Flags.FULL,
+      [("cafe", "caf\u00e9"), ("naive", "na\u00efve")]),
+     ("x 0xdeadbeefcafe y", Flags.FULL,
+      [(None, "x"), (None, "0x"), ("[LONG]", "deadbeefcafe"),
+       ("hex", "deadbeefcafe"), ("digits", "deadbeefcafe"), (None, "y")]),
+     (f"x {_HELLO_BASE64} y", Flags.FULL,
+      [(None, "x"),
+       ("[BASE64]", _HELLO_BASE64),
+       ("utf", _HELLO_BASE64),
+       ("8", _HELLO_BASE64),
+       (None, "y")]),
+     ("caf%C3%A9 bar", Flags.FULL,
+      [("cafe", "caf%C3%A9"), (None, "bar")]),
+     ("don\\u0027t stop", Flags.FULL,
+      [("don't", "don\\u0027t"), (None, "stop")]),
+     ("Mo\\u0441kva", Flags.FULL,
+      [("Moskva", "Mo\\u0441kva")]),
+     ("x\\u0441\\%20", Flags.FULL,
+      [("xs", "x\\u0441\\%"), (None, "20")]),
+     ),
+    ids=("plain", "lowercase", "decoded", "transliterated", "hex",
+         "base64", "percent-decoded", "js-escaped-apostrophe",
+         "js-escaped-cyrillic", "escaped-percent"))
+def test_split_spans(text, flags, expect_spans):
+    """Ensure tokens' spans cover the text they came from, and that
+    tokens that aren't exactly that text are supplied.
+    """
+    spans = TextSplitter().split_spans(text, flags)
+    assert [
+        (span.replacement, text[span.start:span.end])
+        for span in spans
+    ] == expect_spans
+    assert [span.token(text) for span in spans] == \
+        TextSplitter().split(text, flags)
+
+
+@pytest.mark.parametrize(
+    "resource",
+    ("raw-browser-response",
+     "svg-in-base64",
+     "xhtml-1.0",
+     ))
+@pytest.mark.parametrize(
+    "flags",
+    (Flags.FULL,
+     Flags.TAG_NAME,
+     Flags.URL_ATTR_VALUE,
+     ))
+def test_split_spans_resources(resource, flags):
+    """Ensure spans give the same tokens as `split`, in order, and
+    that tokens without replacements are exactly the text they span.
+    """
+    snapshot = json.loads(load_resource(f"{resource}.json"))
+    strings = snapshot.get("result", snapshot)["strings"]
+    splitter = TextSplitter()
+    for text in strings:
+        spans = splitter.split_spans(text, flags)
+        assert [span.token(text) for span in spans] == \
+            splitter.split(text, flags)
+        last_start = 0
+        for span in spans:
+            assert last_start <= span.start <= span.end <= len(text)
+            last_start = span.start
+            if span.replacement is not None:
+                assert span.start < span.end
+
+
+@pytest.mark.parametrize("batch_size", (1, 7, 16, 1024))
+def test_postprocess_batches(batch_size, monkeypatch):
+    """Ensure postprocessing is unaffected by how it's batched.
+    """
+    random = Random(23)
+    alphabet = "0123456789abcdefABCDEF+/'"
+    text = " ".join(
+        "".join(random.choice(alphabet) for _ in range(random.randint(1, 40)))
+        for _ in range(200))
+    expect_tokens = list(TextSplitter().split(text, Flags.BASIC))
+    assert "[BASE64]" in expect_tokens
+    assert "[LONG]" in expect_tokens
+    monkeypatch.setattr(TextSplitter, "POSTPROCESS_BATCH", batch_size)
+    assert list(TextSplitter().split(text, Flags.BASIC)) == expect_tokens
+
+
+@pytest.mark.parametrize("cache_size", (1, 3, 1 << 16))
+def test_postprocessed_cache(cache_size, monkeypatch):
+    """Ensure postprocessing is unaffected by what it has cached.
+    """
+    random = Random(23)
+    alphabet = "0123456789abcdefABCDEF+/'"
+    words = [
+        "".join(random.choice(alphabet) for _ in range(random.randint(1, 40)))
+        for _ in range(50)]
+    texts = [" ".join(random.choices(words, k=40)) for _ in range(20)]
+    expect_tokens = [list(TextSplitter().split(text)) for text in texts]
+    monkeypatch.setattr(TextSplitter, "POSTPROCESS_BATCH", 16)
+    monkeypatch.setattr(TextSplitter, "POSTPROCESSED_CACHE_SIZE", cache_size)
+    splitter = TextSplitter()
+    for _ in range(2):
+        assert [list(splitter.split(text)) for text in texts] == expect_tokens
+    assert len(splitter._postprocessed) < cache_size + 16
+
+
+@pytest.mark.parametrize(
+    "text",
+    ("",
+     "hello world",
+     " hello world " * 100,
+     "hello, world! " * 100,
+     "it's a caf\u00e9&amp;bar\\u0041 " * 100,
+     ))
+def test_iter_split(text):
+    splitter = TextSplitter()
+    assert list(splitter.iter_split(text)) == splitter.split(text)
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    ("hello world ",
+     "hello, world! it's a caf\u00e9&amp;bar\\u0041 %20x ",
+     "a_b c_d e_f ",
+     "x=aGVsbG8gd29ybGQgaGVsbG8=;    \t\n  ",
+     ))
+def test_iter_split_memory(pattern):
+    """Ensure the memory `iter_split` uses doesn't grow with its input.
+    """
+    splitter = TextSplitter()
+
+    def peak_memory(count):
+        text = pattern * count
+        tracemalloc.start()
+        try:
+            for _ in splitter.iter_split(text):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    peak_memory(1000)  # warm up any caches
+    assert peak_memory(8000) < 2 * peak_memory(1000)
+
+
+BUDGET_TEXT = "hello_world caf%C3%A9 北京 &amp; " * 20 + "x" * 64
+
+
+@pytest.mark.parametrize(
+    "budget,expect_reason",
+    ((SplitBudget(max_length=len(BUDGET_TEXT) - 1), "length"),
+     (SplitBudget(max_iterations=10), "iterations"),
+     (SplitBudget(max_seconds=0), "time"),
+     ))
+@pytest.mark.parametrize("engine", TextSplitter.ENGINES)
+def test_split_budget(budget, expect_reason, engine):
+    """Ensure text that exceeds its budget is split cheaply instead,
+    and the degradation reported.
+    """
+    degradations = []
+    budget.on_degraded = lambda *args: degradations.append(args)
+    tokens = TextSplitter(engine=engine, budget=budget).split(BUDGET_TEXT)
+    assert degradations == [(expect_reason, BUDGET_TEXT)]
+    assert tokens != TextSplitter(engine=engine).split(BUDGET_TEXT)
+    assert tokens[:2] == ["hello", "world"]
+    assert tokens[-7:] == [
+        "C3", "A9", "Bei", "Jing", "amp", "[LONG]", "alphabetic"]
+
+
+@pytest.mark.parametrize(
+    "budget",
+    (SplitBudget(),
+     SplitBudget(max_length=len(BUDGET_TEXT)),
+     SplitBudget(max_iterations=1 << 20, max_seconds=60),
+     ))
+def test_split_budget_unspent(budget):
+    """Ensure text that doesn't exceed its budget splits as normal.
+    """
+    budget.on_degraded = pytest.fail
+    splitter = TextSplitter(budget=budget)
+    assert splitter.split(BUDGET_TEXT) == TextSplitter().split(BUDGET_TEXT)
+
+
+@pytest.mark.parametrize(
+    "text,expect_tokens",
+    (("hello world " * 10, ["[LONG]"]),
+     ("hello_world " * 5, ["hello", "world", "hello", "[LONG]"]),
+     ))
+def test_split_budget_long_fallback(text, expect_tokens):
+    """Ensure the unsplit remainder of text that exceeds its budget
+    can be replaced with `long_token`.
+    """
+    budget = SplitBudget(max_length=100, max_iterations=10, fallback="long")
+    assert TextSplitter(budget=budget).split(text) == expect_tokens
+
+
+def test_unknown_split_budget_fallback():
+    with pytest.raises(ValueError):
+        SplitBudget(fallback="nope")
@@ -0,0 +1,31 @@
+from random import Random
+
+import pytest
+
+from unidecode import unidecode
+
+from dom_tokenizers.pre_tokenizers.transliterate import transliterate
+
+
+@pytest.mark.parametrize(
+    "word",
+    ("", "hello", "Москва", "北京", "القاهرة", "한국어", "ﬁx½²",
+     "नमस्ते", "𝔘𝔫𝔦", "\U000e0001\U0010ffff",
+     ))
+def test_transliterate(word):
+    """Ensure words transliterate exactly as unidecode would.
+    """
+    assert transliterate(word) == unidecode(word)
+    assert transliterate(word) == unidecode(word)  # cached
+
+
+def test_transliterate_code_points():
+    """Ensure random code points transliterate as unidecode would.
+    """
+    rng = Random(23)
+    code_points = (rng.randrange(0x30000) for _ in range(4096))
+    word = "".join(
+        chr(code_point)
+        for code_point in code_points
+        if not 0xd800 <= code_point <= 0xdfff)  # unidecode warns
+    assert transliterate(word) == unidecode(word)